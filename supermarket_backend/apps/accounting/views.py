@@ -14,12 +14,14 @@ from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.utils.crypto import get_random_string
 from apps.accounting.utils import generate_verification_code, send_email_verification
 
 
+from apps.cart.guest import merge_guest_cart
 from apps.orders.models import Order
 from .models import Address, PasswordResetToken
 from .serializers import (
@@ -285,12 +287,16 @@ class ResendVerificationEmailView(APIView):
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        
-        
-        if response.status_code == 200:
-            response.data['message'] = 'Login successful'
-        
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        response = Response(serializer.validated_data, status=status.HTTP_200_OK)
+        response.data['message'] = 'Login successful'
+        merge_guest_cart(request, serializer.user, response)
+
         return response
 
 
@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+from apps.products.models import Product
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from .storage import CartLine, CartStore, get_cart_store
+
+COOKIE_NAME = getattr(settings, "GUEST_CART_COOKIE_NAME", "guest_cart")
+COOKIE_MAX_AGE = getattr(settings, "GUEST_CART_COOKIE_AGE", 60 * 60 * 24 * 30)
+COOKIE_SALT = "apps.cart.guest"
+MAX_LINES = 100
+
+
+def read_guest_cart(request):
+    """
+    Return the `{product_id: quantity}` stored in the request's guest cart cookie.
+
+    A missing, expired or tampered cookie reads as an empty cart.
+    """
+    value = request.get_signed_cookie(
+        COOKIE_NAME, default="", salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE
+    )
+    items = {}
+    for pair in value.split(","):
+        product_id, _, quantity = pair.partition(":")
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            items[int(product_id)] = int(quantity)
+    return items
+
+
+def write_guest_cart(response, items):
+    if not items:
+        response.delete_cookie(COOKIE_NAME)
+        return
+    value = ",".join(f"{product_id}:{quantity}" for product_id, quantity in items.items())
+    response.set_signed_cookie(
+        COOKIE_NAME, value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+        httponly=True, samesite="Lax", secure=not settings.DEBUG,
+    )
+
+
+class GuestCartStore(CartStore):
+    """
+    Cart of an anonymous visitor, kept entirely in a signed cookie.
+
+    Lines are `product_id:quantity` pairs signed with the secret key, so guests
+    cost no database writes; prices are looked up when the cart is read. Call
+    `save(response)` to send changes back to the client. Line ids are product ids.
+    """
+
+    def __init__(self, request):
+        self.items = read_guest_cart(request)
+        self.modified = False
+
+    def _put(self, product_id, quantity):
+        if product_id not in self.items and len(self.items) >= MAX_LINES:
+            raise ValidationError({"error": f"A guest cart holds at most {MAX_LINES} products"})
+        self.items[product_id] = max(1, quantity)
+        self.modified = True
+        return self.items[product_id]
+
+    def lines(self, user, lock=False):
+        return [CartLine(product_id, product_id, quantity) for product_id, quantity in self.items.items()]
+
+    def add(self, user, product_id, quantity):
+        return self._put(product_id, self.items.get(product_id, 0) + quantity)
+
+    def set(self, user, product_id, quantity):
+        self._put(product_id, quantity)
+
+    def remove(self, user, product_id):
+        self.modified = True
+        return self.items.pop(product_id, None) is not None
+
+    def find_line(self, user, line_id):
+        return int(line_id) if int(line_id) in self.items else None
+
+    def clear(self, user):
+        self.items = {}
+        self.modified = True
+
+    def write(self, user, changes):
+        for product_id, quantity in changes.items():
+            if quantity is None:
+                self.remove(user, product_id)
+            else:
+                self._put(product_id, quantity)
+
+    def summary(self, user):
+        prices = dict(Product.objects.filter(id__in=self.items).values_list("id", "price"))
+        return {
+            "item_count": sum(quantity for product_id, quantity in self.items.items() if product_id in prices),
+            "subtotal": sum(
+                (prices[product_id] * quantity for product_id, quantity in self.items.items() if product_id in prices),
+                Decimal("0.00"),
+            ),
+        }
+
+    def save(self, response):
+        if self.modified:
+            write_guest_cart(response, self.items)
+
+
+def merge_guest_cart(request, user, response):
+    """
+    Fold the request's guest cart into `user`'s cart and drop the cookie.
+
+    Quantities are added to any existing lines; the whole guest cart is written
+    with one bulk upsert through the user's cart store.
+    """
+    items = read_guest_cart(request)
+    if not items:
+        return
+    live = Product.active.only("id").in_bulk(list(items))
+    get_cart_store().apply(
+        user, [("add", product_id, quantity) for product_id, quantity in items.items() if product_id in live]
+    )
+    response.delete_cookie(COOKIE_NAME)
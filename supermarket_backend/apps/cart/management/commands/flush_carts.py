@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...storage import get_cart_store
+
+
+class Command(BaseCommand):
+    help = "Writes carts changed in the hot cart store back to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", type=float, metavar="SECONDS",
+            help="Keep flushing, sleeping this long whenever nothing is dirty",
+        )
+
+    def handle(self, *args, **options):
+        store = get_cart_store()
+        flushed = 0
+        while True:
+            batch = store.flush()
+            flushed += batch
+            if batch:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts"))
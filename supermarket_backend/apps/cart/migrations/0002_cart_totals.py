@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+from apps.cart.totals import refresh_cart_totals
+
+
+def compute_cart_totals(apps, schema_editor):
+    refresh_cart_totals(apps.get_model('cart', 'Cart').objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(compute_cart_totals, migrations.RunPython.noop),
+    ]
@@ -5,7 +5,7 @@ from .models import Cart, CartItem
 
 
 class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = ProductSerializer(read_only=True, fields=ProductSerializer.list_fields)
     total_price = serializers.SerializerMethodField()
 
     class Meta:
@@ -17,13 +17,20 @@ class CartItemSerializer(serializers.ModelSerializer):
         return obj.product.price * obj.quantity
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    """
+    Renders a cart loaded by `storage.load_cart`, whose `lines` hold the items.
+    """
+    items = CartItemSerializer(source='lines', many=True, read_only=True)
+    item_count = serializers.SerializerMethodField()
     total_cart_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'total_cart_price']
+        fields = ['id', 'user', 'items', 'item_count', 'total_cart_price']
+
+    def get_item_count(self, obj):
+        return sum(item.quantity for item in obj.lines)
 
     def get_total_cart_price(self, obj):
         
-        return sum(item.total_price for item in obj.items.all())
\ No newline at end of file
+        return sum(item.total_price for item in obj.lines)
\ No newline at end of file
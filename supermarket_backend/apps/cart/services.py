@@ -0,0 +1,62 @@
+from django.db import connection, transaction
+
+from .models import Cart, CartItem
+
+# Backends whose INSERT supports `ON CONFLICT ... DO UPDATE ... RETURNING`.
+UPSERT_VENDORS = ("postgresql", "sqlite")
+
+
+def _upsert_sql(increment):
+    meta = CartItem._meta
+    table = connection.ops.quote_name(meta.db_table)
+    cart, product, quantity = (
+        connection.ops.quote_name(meta.get_field(name).column) for name in ("cart", "product", "quantity")
+    )
+    # the increment is passed separately from the inserted value so a negative
+    # add can lower an existing line; either way a line never drops below one
+    new_value = f"{table}.{quantity} + %s" if increment else f"excluded.{quantity}"
+    return (
+        f"INSERT INTO {table} ({cart}, {product}, {quantity}) VALUES (%s, %s, %s) "
+        f"ON CONFLICT ({cart}, {product}) DO UPDATE SET "
+        f"{quantity} = CASE WHEN {new_value} < 1 THEN 1 ELSE {new_value} END "
+        f"RETURNING {quantity}"
+    )
+
+
+def upsert_line(cart_id, product_id, quantity, increment=True):
+    """
+    Add `quantity` to a cart line (or set it, with `increment=False`) in one statement.
+
+    Relies on the `(cart, product)` unique constraint, so concurrent adds of the
+    same product neither create duplicate lines nor lose increments. A line never
+    drops below one. Returns the line's new quantity.
+    """
+    if connection.vendor in UPSERT_VENDORS:
+        params = [cart_id, product_id, max(1, quantity)]
+        if increment:
+            params += [quantity, quantity]
+        with connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(increment), params)
+            return cursor.fetchone()[0]
+    with transaction.atomic():
+        Cart.objects.select_for_update().filter(id=cart_id).first()
+        item, created = CartItem.objects.get_or_create(
+            cart_id=cart_id, product_id=product_id, defaults={"quantity": max(1, quantity)}
+        )
+        if not created:
+            item.quantity = max(1, item.quantity + quantity if increment else quantity)
+            item.save(update_fields=["quantity"])
+        return item.quantity
+
+
+def get_cart_id(user):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    return cart.id
+
+
+def add_to_cart(user, product_id, quantity):
+    return upsert_line(get_cart_id(user), product_id, quantity)
+
+
+def set_cart_quantity(user, product_id, quantity):
+    return upsert_line(get_cart_id(user), product_id, quantity, increment=False)
@@ -0,0 +1,16 @@
+from apps.products.models import Product
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Cart
+from .totals import refresh_cart_totals
+
+
+@receiver(post_save, sender=Product)
+def refresh_totals_for_price_change(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """
+    Cart subtotals are priced at current prices, so re-price carts holding the product.
+    """
+    if raw or created or (update_fields is not None and "price" not in update_fields):
+        return
+    refresh_cart_totals(Cart.objects.filter(items__product_id=instance.pk))
@@ -0,0 +1,499 @@
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from apps.products.models import Product
+from apps.products.serializers import ProductSerializer
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Cart, CartItem
+from .services import add_to_cart, set_cart_quantity
+from .totals import refresh_cart_totals, refresh_user_cart_totals
+
+# `id` is what clients pass to the update/remove endpoints: the CartItem id in
+# the database store, the product id in stores that keep carts outside it.
+CartLine = namedtuple("CartLine", ["id", "product_id", "quantity"])
+
+# Idle carts drop out of Redis after this long; the database copy stays.
+CART_TTL = getattr(settings, "CART_REDIS_TTL", 60 * 60 * 24 * 7)
+
+
+class CartStore:
+    """
+    Interface every cart storage backend implements.
+
+    Quantities are keyed by product; `find_line` maps the line ids the API hands
+    out back to products.
+    """
+
+    def lines(self, user, lock=False):
+        """
+        Return the user's `CartLine`s; `lock` serialises concurrent writers where supported.
+        """
+        raise NotImplementedError
+
+    def add(self, user, product_id, quantity):
+        """
+        Add `quantity` (may be negative, but a line never drops below one) to a
+        line and return the new quantity.
+        """
+        raise NotImplementedError
+
+    def set(self, user, product_id, quantity):
+        raise NotImplementedError
+
+    def remove(self, user, product_id):
+        raise NotImplementedError
+
+    def find_line(self, user, line_id):
+        """
+        Return the product id of the user's line `line_id`, or None.
+        """
+        raise NotImplementedError
+
+    def clear(self, user):
+        raise NotImplementedError
+
+    def write(self, user, changes):
+        """
+        Apply `{product_id: quantity}` to the cart; a quantity of None removes the line.
+        """
+        raise NotImplementedError
+
+    def apply(self, user, operations):
+        """
+        Fold `(op, product_id, quantity)` operations ("add", "set", "remove") over
+        the current cart and write the resulting lines in one go.
+        """
+        with transaction.atomic():
+            current = {line.product_id: line.quantity for line in self.lines(user, lock=True)}
+            changes = {}
+            for op, product_id, quantity in operations:
+                if op == "remove":
+                    current.pop(product_id, None)
+                    changes[product_id] = None
+                    continue
+                if op == "add":
+                    quantity += current.get(product_id, 0)
+                current[product_id] = changes[product_id] = max(1, quantity)
+            self.write(user, changes)
+
+    def summary(self, user):
+        """
+        Return `{"item_count", "subtotal"}` for the header badge and mini-cart.
+        """
+        row = Cart.objects.filter(user=user).values("item_count", "subtotal").first()
+        return row or {"item_count": 0, "subtotal": Decimal("0.00")}
+
+    def flush(self, users=None):
+        """
+        Persist pending changes for `users` (or every dirty cart) to the database.
+        """
+        return 0
+
+
+class DatabaseCartStore(CartStore):
+    """
+    Reads and writes `Cart`/`CartItem` rows directly.
+    """
+
+    def lines(self, user, lock=False):
+        if lock:
+            Cart.objects.get_or_create(user=user)
+            Cart.objects.select_for_update().filter(user=user).first()
+        return [
+            CartLine(*row)
+            for row in CartItem.objects.filter(cart__user=user)
+            .order_by("id")
+            .values_list("id", "product_id", "quantity")
+        ]
+
+    def add(self, user, product_id, quantity):
+        quantity = add_to_cart(user, product_id, quantity)
+        refresh_user_cart_totals(user)
+        return quantity
+
+    def set(self, user, product_id, quantity):
+        set_cart_quantity(user, product_id, quantity)
+        refresh_user_cart_totals(user)
+
+    def remove(self, user, product_id):
+        deleted, _ = CartItem.objects.filter(cart__user=user, product_id=product_id).delete()
+        refresh_user_cart_totals(user)
+        return bool(deleted)
+
+    def find_line(self, user, line_id):
+        return (
+            CartItem.objects.filter(id=line_id, cart__user=user)
+            .values_list("product_id", flat=True)
+            .first()
+        )
+
+    def clear(self, user):
+        CartItem.objects.filter(cart__user=user).delete()
+        refresh_user_cart_totals(user)
+
+    def write(self, user, changes):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        removed = [product_id for product_id, quantity in changes.items() if quantity is None]
+        if removed:
+            CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in changes.items()
+                if quantity is not None
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "product"],
+            update_fields=["quantity"],
+        )
+        refresh_user_cart_totals(user)
+
+
+class LocalHashClient:
+    """
+    In-process stand-in for the handful of Redis hash/set commands the hot cart
+    store uses. Per-process, so only suitable for development and tests.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    def _live(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def exists(self, key):
+        with self._lock:
+            return int(self._live(key) is not None)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._live(key) or {})
+
+    def hexists(self, key, field):
+        with self._lock:
+            return str(field) in (self._live(key) or {})
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            self._live(key)
+            values = self._data.setdefault(key, {})
+            if str(field) in values:
+                return 0
+            values[str(field)] = str(value)
+            return 1
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._live(key)
+            self._data.setdefault(key, {})[str(field)] = str(value)
+
+    def hincrby(self, key, field, amount):
+        with self._lock:
+            self._live(key)
+            values = self._data.setdefault(key, {})
+            values[str(field)] = str(int(values.get(str(field), 0)) + amount)
+            return int(values[str(field)])
+
+    def hdel(self, key, field):
+        with self._lock:
+            return int((self._live(key) or {}).pop(str(field), None) is not None)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is None:
+                return 0
+            self._expires[key] = time.monotonic() + seconds
+            return 1
+
+    def ttl(self, key):
+        with self._lock:
+            if self._live(key) is None:
+                return -2
+            deadline = self._expires.get(key)
+            return -1 if deadline is None else round(deadline - time.monotonic())
+
+    def delete(self, key):
+        with self._lock:
+            self._expires.pop(key, None)
+            return int(self._data.pop(key, None) is not None)
+
+    def sadd(self, key, member):
+        with self._lock:
+            self._data.setdefault(key, set()).add(str(member))
+
+    def srem(self, key, member):
+        with self._lock:
+            self._data.get(key, set()).discard(str(member))
+
+    def spop(self, key, count):
+        with self._lock:
+            members = self._data.get(key, set())
+            return [members.pop() for _ in range(min(count, len(members)))]
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """
+    Queues commands and runs them under the client's lock, like MULTI/EXEC.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args):
+            self.commands.append((method, args))
+            return self
+
+        return queue
+
+    def execute(self):
+        with self.client._lock:
+            return [method(*args) for method, args in self.commands]
+
+
+class RedisCartStore(CartStore):
+    """
+    Keeps active carts in Redis hashes and writes them behind to the database.
+
+    Each cart is a hash of `product_id -> quantity`, so every mutation is a single
+    O(1) hash command. Mutated carts are added to a dirty set; `flush` (run by the
+    `flush_carts` command, and synchronously at checkout) copies them into
+    `Cart`/`CartItem` in batches. A cart missing from Redis is loaded from the
+    database on first touch, and expires `CART_REDIS_TTL` seconds after its last
+    write.
+
+    `CART_REDIS_URL` selects the server; `locmem://` uses an in-process client.
+    """
+    key_prefix = "cart:"
+    dirty_key = "cart:dirty"
+    loaded_field = "_loaded"
+    flush_batch_size = 500
+
+    _local_client = None
+
+    def __init__(self, client=None):
+        self.client = client or self.get_client()
+
+    @classmethod
+    def get_client(cls):
+        url = getattr(settings, "CART_REDIS_URL", "redis://localhost:6379/1")
+        if url.startswith("locmem://"):
+            if cls._local_client is None:
+                cls._local_client = LocalHashClient()
+            return cls._local_client
+        import redis
+
+        return redis.Redis.from_url(url, decode_responses=True)
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    def _ensure_loaded(self, user):
+        key = self._key(user.pk)
+        if self.client.exists(key):
+            return key
+        # HSETNX never overwrites, so a concurrent load or mutation wins.
+        for product_id, quantity in CartItem.objects.filter(cart__user=user).values_list(
+            "product_id", "quantity"
+        ):
+            self.client.hsetnx(key, product_id, quantity)
+        self.client.hsetnx(key, self.loaded_field, 1)
+        self.client.expire(key, CART_TTL)
+        return key
+
+    def _read(self, user):
+        values = self.client.hgetall(self._ensure_loaded(user))
+        values.pop(self.loaded_field, None)
+        return {int(product_id): int(quantity) for product_id, quantity in values.items()}
+
+    def _dirty(self, user):
+        self.client.expire(self._key(user.pk), CART_TTL)
+        self.client.sadd(self.dirty_key, user.pk)
+
+    def lines(self, user, lock=False):
+        return [
+            CartLine(product_id, product_id, quantity)
+            for product_id, quantity in self._read(user).items()
+        ]
+
+    def add(self, user, product_id, quantity):
+        key = self._ensure_loaded(user)
+        quantity = self.client.hincrby(key, product_id, quantity)
+        if quantity < 1:
+            self.client.hset(key, product_id, 1)
+            quantity = 1
+        self._dirty(user)
+        return quantity
+
+    def set(self, user, product_id, quantity):
+        self.client.hset(self._ensure_loaded(user), product_id, quantity)
+        self._dirty(user)
+
+    def remove(self, user, product_id):
+        removed = self.client.hdel(self._ensure_loaded(user), product_id)
+        self._dirty(user)
+        return bool(removed)
+
+    def find_line(self, user, line_id):
+        if self.client.hexists(self._ensure_loaded(user), line_id):
+            return int(line_id)
+        return None
+
+    def write(self, user, changes):
+        self.apply(user, [
+            ("remove", product_id, None) if quantity is None else ("set", product_id, quantity)
+            for product_id, quantity in changes.items()
+        ])
+
+    def apply(self, user, operations):
+        """
+        Send the operations as one MULTI/EXEC transaction of hash commands.
+
+        Adds go out as HINCRBY deltas instead of a read-modify-write of the cart, so
+        concurrent batches never lose each other's updates.
+        """
+        key = self._ensure_loaded(user)
+        pipeline = self.client.pipeline()
+        last = {}
+        for position, (op, product_id, quantity) in enumerate(operations):
+            if op == "remove":
+                pipeline.hdel(key, product_id)
+            elif op == "add":
+                pipeline.hincrby(key, product_id, quantity)
+            else:
+                pipeline.hset(key, product_id, max(1, quantity))
+            last[product_id] = (op, position)
+        pipeline.expire(key, CART_TTL)
+        pipeline.sadd(self.dirty_key, user.pk)
+        results = pipeline.execute()
+        # a negative add never leaves a line below one
+        for product_id, (op, position) in last.items():
+            if op == "add" and results[position] < 1:
+                self.client.hset(key, product_id, 1)
+
+    def clear(self, user):
+        self.client.delete(self._key(user.pk))
+        self.client.srem(self.dirty_key, user.pk)
+        CartItem.objects.filter(cart__user=user).delete()
+        refresh_user_cart_totals(user)
+
+    def summary(self, user):
+        lines = self._read(user)
+        prices = dict(Product.objects.filter(id__in=lines).values_list("id", "price"))
+        return {
+            "item_count": sum(quantity for product_id, quantity in lines.items() if product_id in prices),
+            "subtotal": sum(
+                (prices[product_id] * quantity for product_id, quantity in lines.items() if product_id in prices),
+                Decimal("0.00"),
+            ),
+        }
+
+    def flush(self, users=None):
+        if users is not None:
+            user_ids = [user.pk for user in users]
+            for user_id in user_ids:
+                self.client.srem(self.dirty_key, user_id)
+        else:
+            user_ids = self.client.spop(self.dirty_key, self.flush_batch_size)
+        carts = {}
+        for user_id in user_ids:
+            values = self.client.hgetall(self._key(user_id))
+            if values.pop(self.loaded_field, None) is not None:
+                carts[int(user_id)] = {int(pid): int(quantity) for pid, quantity in values.items()}
+        try:
+            self.persist(carts)
+        except Exception:
+            for user_id in carts:
+                self.client.sadd(self.dirty_key, user_id)
+            raise
+        return len(carts)
+
+    @staticmethod
+    def persist(carts):
+        """
+        Make the database lines of each user's cart match `{user_id: {product_id: quantity}}`.
+        """
+        if not carts:
+            return
+        with transaction.atomic():
+            Cart.objects.bulk_create(
+                [Cart(user_id=user_id) for user_id in carts], ignore_conflicts=True
+            )
+            cart_ids = dict(
+                Cart.objects.filter(user_id__in=carts).values_list("user_id", "id")
+            )
+            wanted = {
+                (cart_ids[user_id], product_id): quantity
+                for user_id, lines in carts.items()
+                for product_id, quantity in lines.items()
+            }
+            # lines of products deleted since they were added cannot be stored
+            live = set(
+                Product.objects.filter(
+                    id__in={product_id for _, product_id in wanted}
+                ).values_list("id", flat=True)
+            )
+            stale = [
+                item_id
+                for item_id, cart_id, product_id in CartItem.objects.filter(
+                    cart_id__in=cart_ids.values()
+                ).values_list("id", "cart_id", "product_id")
+                if (cart_id, product_id) not in wanted or product_id not in live
+            ]
+            CartItem.objects.filter(id__in=stale).delete()
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                    for (cart_id, product_id), quantity in wanted.items()
+                    if product_id in live
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "product"],
+                update_fields=["quantity"],
+            )
+            refresh_cart_totals(Cart.objects.filter(id__in=cart_ids.values()))
+
+
+def get_cart_store():
+    store_path = getattr(settings, "CART_STORAGE", "apps.cart.storage.DatabaseCartStore")
+    return import_string(store_path)()
+
+
+def load_cart(user, store=None):
+    """
+    Return the user's `Cart` with `lines` set to its items, products loaded in one query.
+
+    Anonymous visitors get an unsaved `Cart` over their guest store's lines.
+    """
+    store = store or get_cart_store()
+    if user.is_authenticated:
+        cart, _ = Cart.objects.get_or_create(user=user)
+    else:
+        cart = Cart()
+    lines = store.lines(user)
+    products = Product.objects.only(*ProductSerializer.list_fields).in_bulk(
+        [line.product_id for line in lines]
+    )
+    cart.lines = [
+        CartItem(id=line.id, cart=cart, product=products[line.product_id], quantity=line.quantity)
+        for line in lines
+        if line.product_id in products
+    ]
+    return cart
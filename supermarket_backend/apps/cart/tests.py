@@ -1,3 +1,298 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
 
+from apps.products.models import Product
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
 
+from .guest import COOKIE_NAME
+from .models import Cart, CartItem
+from .services import add_to_cart, set_cart_quantity
+from .storage import CART_TTL, DatabaseCartStore, LocalHashClient, RedisCartStore
+
+
+class CartUpsertTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.product = Product.objects.create(
+            name="Apple", price="1.50", description="", image="http://example.com/a.png"
+        )
+
+    def test_add_accumulates_on_one_line(self):
+        self.assertEqual(add_to_cart(self.user, self.product.id, 2), 2)
+        self.assertEqual(add_to_cart(self.user, self.product.id, 3), 5)
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_negative_add_stops_at_one(self):
+        add_to_cart(self.user, self.product.id, 2)
+        self.assertEqual(add_to_cart(self.user, self.product.id, -5), 1)
+
+    def test_set_replaces_quantity(self):
+        add_to_cart(self.user, self.product.id, 2)
+        self.assertEqual(set_cart_quantity(self.user, self.product.id, 7), 7)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+
+class CartReadTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", price="1.50", description="", image="http://example.com/p.png")
+            for i in range(20)
+        ])
+        self.store = DatabaseCartStore()
+
+    def test_cart_read_cost_is_flat_in_cart_size(self):
+        queries = {}
+        for lines in (1, 20):
+            self.store.apply(self.user, [("set", product.id, 2) for product in self.products[:lines]])
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get("/api/cart/")
+            self.assertEqual(len(response.json()["items"]), lines)
+            queries[lines] = len(captured)
+        self.assertEqual(queries[1], queries[20])
+
+    def test_totals_follow_every_write(self):
+        first, second = self.products[0].id, self.products[1].id
+        self.store.add(self.user, first, 2)
+        self.store.set(self.user, second, 3)
+        self.assertEqual(self.client.get("/api/cart/summary/").json(), {"item_count": 5, "subtotal": 7.5})
+
+        self.store.remove(self.user, second)
+        self.assertEqual(self.store.summary(self.user), {"item_count": 2, "subtotal": Decimal("3.00")})
+        self.store.clear(self.user)
+        self.assertEqual(self.store.summary(self.user), {"item_count": 0, "subtotal": Decimal("0.00")})
+
+    def test_totals_follow_imports_and_archiving(self):
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(sku="SKU-1")
+        self.store.set(self.user, product.id, 2)
+        with tempfile.TemporaryDirectory() as directory:
+            feed = Path(directory) / "feed.ndjson"
+            feed.write_text(json.dumps({"sku": "SKU-1", "name": product.name, "price": "5.00"}) + "\n")
+            call_command("import_products", str(feed), stdout=io.StringIO())
+        self.assertEqual(self.store.summary(self.user), {"item_count": 2, "subtotal": Decimal("10.00")})
+
+        Product.objects.filter(pk=product.pk).update(
+            is_active=False, updated_at=timezone.now() - timedelta(days=365)
+        )
+        call_command("archive_products", stdout=io.StringIO())
+        self.assertEqual(self.store.summary(self.user), {"item_count": 0, "subtotal": Decimal("0.00")})
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", price="1.00", description="", image="http://example.com/p.png")
+            for i in range(2)
+        ])
+        self.client = APIClient()
+
+    def test_guest_cart_lives_in_a_signed_cookie(self):
+        product_id = self.products[0].id
+        self.client.post("/api/cart/add/", {"product_id": product_id, "quantity": 2}, format="json")
+        self.client.post("/api/cart/add/", {"product_id": product_id}, format="json")
+        self.assertEqual(self.client.get("/api/cart/summary/").json()["item_count"], 3)
+        self.assertFalse(Cart.objects.exists())
+
+        self.client.cookies[COOKIE_NAME] = f"{product_id}:50"
+        self.assertEqual(self.client.get("/api/cart/summary/").json()["item_count"], 0)
+
+    def test_login_merges_the_guest_cart(self):
+        first, second = (product.id for product in self.products)
+        user = get_user_model().objects.create_user(email="shopper@example.com", name="Shopper", password="secret")
+        add_to_cart(user, first, 1)
+        self.client.post("/api/cart/add/", {"product_id": first, "quantity": 2}, format="json")
+        self.client.post("/api/cart/add/", {"product_id": second}, format="json")
+
+        response = self.client.post("/api/login/", {"email": "shopper@example.com", "password": "secret"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[COOKIE_NAME].value, "")
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user=user).values_list("product_id", "quantity")),
+            {first: 3, second: 1},
+        )
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}", price="2.00", description="", image="http://example.com/p.png"
+            )
+            for i in range(3)
+        ]
+
+    def batch(self, operations):
+        return self.client.post("/api/cart/batch/", {"operations": operations}, format="json")
+
+    def test_operations_apply_in_order(self):
+        first, second, third = (product.id for product in self.products)
+        response = self.batch([
+            {"op": "add", "product_id": first, "quantity": 2},
+            {"op": "add", "product_id": first, "quantity": 3},
+            {"op": "set", "product_id": second, "quantity": 4},
+            {"op": "add", "product_id": third},
+            {"op": "remove", "product_id": third},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {item["product"]["id"]: item["quantity"] for item in response.json()["items"]},
+            {first: 5, second: 4},
+        )
+        self.assertEqual(response.json()["total_cart_price"], 18)
+
+    def test_an_invalid_operation_rejects_the_whole_batch(self):
+        first = self.products[0].id
+        self.assertEqual(
+            self.batch([{"op": "add", "product_id": first}, {"op": "set", "product_id": first, "quantity": 0}]).status_code,
+            400,
+        )
+        self.products[1].delete()
+        response = self.batch([{"op": "add", "product_id": first}, {"op": "add", "product_id": self.products[1].id}])
+        self.assertEqual((response.status_code, response.json()["index"]), (404, 1))
+        self.assertFalse(CartItem.objects.exists())
+
+
+class RedisCartStoreTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}", price="1.00", description="", image="http://example.com/p.png"
+            )
+            for i in range(2)
+        ]
+        self.client = LocalHashClient()
+        self.store = RedisCartStore(client=self.client)
+
+    def quantities(self):
+        return {line.product_id: line.quantity for line in self.store.lines(self.user)}
+
+    def test_apply_folds_operations_in_order(self):
+        first, second = (product.id for product in self.products)
+        self.store.apply(self.user, [("add", first, 2), ("add", first, -5), ("set", second, 4)])
+        self.assertEqual(self.quantities(), {first: 1, second: 4})
+
+        self.store.apply(self.user, [("remove", second, None), ("add", second, 3), ("set", first, 0)])
+        self.assertEqual(self.quantities(), {first: 1, second: 3})
+
+    def test_concurrent_batches_keep_every_add(self):
+        product_id = self.products[0].id
+        self.store.lines(self.user)  # load the cart before the threads race on it
+        start = threading.Barrier(8)
+
+        def worker():
+            start.wait()
+            for _ in range(25):
+                self.store.apply(self.user, [("add", product_id, 1)])
+
+        workers = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(self.quantities(), {product_id: 200})
+
+    def test_idle_carts_expire_and_reload_from_the_database(self):
+        product_id = self.products[0].id
+        self.store.apply(self.user, [("add", product_id, 2)])
+        key = self.store._key(self.user.pk)
+        self.assertTrue(0 < self.client.ttl(key) <= CART_TTL)
+
+        self.store.flush([self.user])
+        self.client.expire(key, 0)
+        self.assertFalse(self.client.exists(key))
+        self.assertEqual(self.quantities(), {product_id: 2})
+
+
+class ConcurrentCartUpsertTests(TransactionTestCase):
+    threads = 8
+    adds_per_thread = 25
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}", price="1.00", description="", image="http://example.com/p.png"
+            )
+            for i in range(3)
+        ]
+        Cart.objects.create(user=self.user)
+
+    def hammer(self, add):
+        """
+        Run `add(product_id)` from many threads at once; return (errors, adds/sec).
+        """
+        errors = []
+        start = threading.Barrier(self.threads)
+
+        def worker(index):
+            try:
+                start.wait()
+                for i in range(self.adds_per_thread):
+                    add(self.products[(index + i) % len(self.products)].id)
+            except Exception as error:  # pragma: no cover - reported below
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(self.threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return errors, self.threads * self.adds_per_thread / elapsed
+
+    def legacy_add(self, product_id):
+        """
+        The read-modify-write `AddToCartView` used before the upsert.
+        """
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        item, created = CartItem.objects.get_or_create(cart=cart, product_id=product_id)
+        if not created:
+            item.quantity += 1
+        item.save()
+
+    def test_concurrent_adds_are_exact(self):
+        errors, rate = self.hammer(lambda product_id: add_to_cart(self.user, product_id, 1))
+
+        self.assertEqual(errors, [])
+        lines = CartItem.objects.filter(cart__user=self.user)
+        self.assertEqual(lines.count(), len(self.products))
+        self.assertEqual(
+            sum(lines.values_list("quantity", flat=True)), self.threads * self.adds_per_thread
+        )
+
+        CartItem.objects.all().delete()
+        _, legacy_rate = self.hammer(self.legacy_add)
+        # loose bound: this guards against regressions, not timer noise
+        self.assertGreater(rate, legacy_rate * 0.5)
@@ -0,0 +1,30 @@
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Cart
+
+
+def refresh_cart_totals(carts):
+    """
+    Recompute `item_count` and `subtotal` for a queryset of carts in one UPDATE.
+
+    The line model is taken from the queryset so the data migration can pass
+    historical models.
+    """
+    line_model = carts.model._meta.get_field("items").related_model
+    lines = line_model.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+    quantity = lines.annotate(total=Sum("quantity")).values("total")
+    amount = lines.annotate(
+        total=Sum(F("quantity") * F("product__price"), output_field=DecimalField(max_digits=12, decimal_places=2))
+    ).values("total")
+    return carts.update(
+        item_count=Coalesce(Subquery(quantity, output_field=IntegerField()), Value(0)),
+        subtotal=Coalesce(
+            Subquery(amount, output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ),
+    )
+
+
+def refresh_user_cart_totals(*users):
+    return refresh_cart_totals(Cart.objects.filter(user__in=users))
@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import CartView, AddToCartView, RemoveFromCartView, UpdateCartItemView
+from .views import (
+    CartView, CartSummaryView, AddToCartView, CartBatchView, RemoveFromCartView, UpdateCartItemView
+)
 
 urlpatterns = [
     path('cart/', CartView.as_view(), name='cart-detail'),
+    path('cart/summary/', CartSummaryView.as_view(), name='cart-summary'),
     path('cart/add/', AddToCartView.as_view(), name='add-to-cart'),
     path('cart/remove/<int:cart_item_id>/', RemoveFromCartView.as_view(), name='remove-from-cart'),
     path('cart/update/<int:cart_item_id>/', UpdateCartItemView.as_view(), name='update-cart-item'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),
 ]
\ No newline at end of file
@@ -1,30 +1,54 @@
 from apps.products.models import Product
-from django.db.models import Prefetch
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from django.utils.functional import cached_property
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Cart, CartItem
-from .serializers import CartItemSerializer, CartSerializer
+from .guest import GuestCartStore
+from .serializers import CartSerializer
+from .storage import get_cart_store, load_cart
 
 
-class CartView(generics.RetrieveAPIView):
+class CartStoreMixin:
+    """
+    Serves signed-in users from the configured cart store and anonymous visitors
+    from the signed-cookie guest cart, writing the cookie back on the response.
+    """
+    permission_classes = [AllowAny]
+
+    @cached_property
+    def store(self):
+        if self.request.user.is_authenticated:
+            return get_cart_store()
+        return GuestCartStore(self.request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if isinstance(self.__dict__.get("store"), GuestCartStore):
+            self.store.save(response)
+        return response
+
+
+class CartView(CartStoreMixin, generics.RetrieveAPIView):
     serializer_class = CartSerializer
-    permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        
-        cart, created = Cart.objects.get_or_create(
-            user=self.request.user, defaults={"user": self.request.user}
-        )
-        cart.items.prefetch_related("product")  
-        return cart
+        return load_cart(self.request.user, self.store)
+
+
+
+class CartSummaryView(CartStoreMixin, APIView):
+    """
+    Item count and subtotal for the header badge and mini-cart.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return Response(self.store.summary(request.user))
 
 
 
-class AddToCartView(generics.CreateAPIView):
-    permission_classes = [IsAuthenticated]
+class AddToCartView(CartStoreMixin, generics.CreateAPIView):
 
     def post(self, request, *args, **kwargs):
         product_id = request.data.get("product_id")
@@ -35,41 +59,22 @@ class AddToCartView(generics.CreateAPIView):
                 {"error": "Product ID is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        if not Product.active.filter(id=product_id).exists():
             return Response(
                 {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-
-        
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-
-        if not created:
-            
-            if "set_quantity" in request.data:
-                
-                cart_item.quantity = int(request.data["set_quantity"])
-            else:
-                
-                cart_item.quantity += quantity
+        store = self.store
+        if "set_quantity" in request.data:
+            store.set(request.user, int(product_id), max(1, int(request.data["set_quantity"])))
         else:
-            
-            cart_item.quantity = quantity
-
-        
-        cart_item.quantity = max(1, cart_item.quantity)
-        cart_item.save()
+            store.add(request.user, int(product_id), quantity)
 
         return Response(
             {"message": "Product added to cart"}, status=status.HTTP_201_CREATED
         )
 
-class RemoveFromCartView(generics.DestroyAPIView):
-    permission_classes = [IsAuthenticated]
+class RemoveFromCartView(CartStoreMixin, generics.DestroyAPIView):
 
     def delete(self, request, *args, **kwargs):
         cart_item_id = kwargs.get("cart_item_id")
@@ -80,25 +85,21 @@ class RemoveFromCartView(generics.DestroyAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            
-            cart_item = CartItem.objects.select_related("cart").get(
-                id=cart_item_id, cart__user=request.user
-            )
-            cart_item.delete()
-            return Response(
-                {"message": "Product removed from cart"},
-                status=status.HTTP_204_NO_CONTENT,
-            )
-        except CartItem.DoesNotExist:
+        store = self.store
+        product_id = store.find_line(request.user, cart_item_id)
+        if product_id is None:
             return Response(
                 {"error": "Cart item not found"}, status=status.HTTP_404_NOT_FOUND
             )
+        store.remove(request.user, product_id)
+        return Response(
+            {"message": "Product removed from cart"},
+            status=status.HTTP_204_NO_CONTENT,
+        )
 
 
 
-class UpdateCartItemView(APIView):
-    permission_classes = [IsAuthenticated]
+class UpdateCartItemView(CartStoreMixin, APIView):
 
     def patch(self, request, *args, **kwargs):
         cart_item_id = kwargs.get("cart_item_id")
@@ -122,18 +123,65 @@ class UpdateCartItemView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        
-        try:
-            cart_item = CartItem.objects.select_related("cart").get(
-                id=cart_item_id, cart__user=request.user
-            )
-        except CartItem.DoesNotExist:
+        store = self.store
+        product_id = store.find_line(request.user, cart_item_id)
+        if product_id is None:
             return Response(
                 {"error": "Cart item not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        
-        cart_item.quantity = max(1, quantity)  
-        cart_item.save()
+        store.set(request.user, product_id, quantity)
+
+        return Response({"message": "Cart item updated"}, status=status.HTTP_200_OK)
+
+
+
+class CartBatchView(CartStoreMixin, APIView):
+    """
+    Apply several cart changes in one request and return the resulting cart.
+
+    Body: `{"operations": [{"op": "add"|"set"|"remove", "product_id": 1, "quantity": 2}, ...]}`.
+    Operations run in order inside one transaction; lines are addressed by product.
+    """
+    max_operations = 100
+
+    def post(self, request, *args, **kwargs):
+        raw = request.data.get("operations") if isinstance(request.data, dict) else request.data
+        if not isinstance(raw, list) or not raw:
+            return Response(
+                {"error": "operations must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(raw) > self.max_operations:
+            return Response(
+                {"error": f"At most {self.max_operations} operations are allowed"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response({"message": "Cart item updated"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        operations = []
+        for index, operation in enumerate(raw):
+            try:
+                op = operation["op"]
+                product_id = int(operation["product_id"])
+                quantity = int(operation.get("quantity", 1))
+                if op not in ("add", "set", "remove") or (op == "set" and quantity < 1):
+                    raise ValueError
+            except (KeyError, TypeError, ValueError):
+                return Response(
+                    {"error": "Invalid operation", "index": index},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            operations.append((op, product_id, quantity))
+
+        wanted = {product_id for op, product_id, _ in operations if op != "remove"}
+        found = Product.active.only("id").in_bulk(wanted)
+        for index, (op, product_id, _) in enumerate(operations):
+            if op != "remove" and product_id not in found:
+                return Response(
+                    {"error": "Product not found", "index": index},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+        store = self.store
+        store.apply(request.user, operations)
+        return Response(CartSerializer(load_cart(request.user, store)).data, status=status.HTTP_200_OK)
@@ -9,7 +9,7 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'description', 'image']
 
 class CategoryDetailSerializer(serializers.ModelSerializer):
-    products = ProductSerializer(many=True, read_only=True)
+    products = ProductSerializer(many=True, read_only=True, fields=ProductSerializer.list_fields)
 
     class Meta:
         model = Category
@@ -1,3 +1,36 @@
+from apps.products.models import Product
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Category
+
+
+class CategoryConditionalGetTests(TestCase):
+    def setUp(self):
+        self.fruits = Category.objects.create(name='Fruits', slug='fruits')
+        self.dairy = Category.objects.create(name='Dairy', slug='dairy')
+        self.apple = Product.objects.create(
+            name='Apple', price='1.00', category=self.fruits, description='', image='http://example.com/p.png'
+        )
+
+    def etag(self, url):
+        return self.client.get(url)['ETag']
+
+    def test_moving_a_product_changes_both_category_etags(self):
+        fruits, dairy = self.etag('/api/categories/fruits/'), self.etag('/api/categories/dairy/')
+        self.assertEqual(
+            self.client.get('/api/categories/fruits/', HTTP_IF_NONE_MATCH=fruits).status_code, 304
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.category = self.dairy
+            self.apple.save()
+        self.assertNotEqual(self.etag('/api/categories/fruits/'), fruits)
+        self.assertNotEqual(self.etag('/api/categories/dairy/'), dairy)
+
+    def test_category_list_changes_on_a_rename(self):
+        etag = self.etag('/api/categories/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dairy.name = 'Dairy & Eggs'
+            self.dairy.save()
+        response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
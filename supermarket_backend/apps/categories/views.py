@@ -1,14 +1,28 @@
+from apps.products.cache import CATEGORIES_MARKER, category_marker
+from apps.products.models import Product
+from apps.products.serializers import ProductSerializer
+from django.db.models import Prefetch
+from core.conditional import marker_condition
 from rest_framework import generics
 from .models import Category
 from .serializers import CategorySerializer, CategoryDetailSerializer
 
+@marker_condition(lambda request, **kwargs: [CATEGORIES_MARKER])
 class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = []
 
+@marker_condition(lambda request, slug, **kwargs: [CATEGORIES_MARKER, category_marker(slug)])
 class CategoryDetailView(generics.RetrieveAPIView):
-    queryset = Category.objects.all().prefetch_related('products')  
+    queryset = Category.objects.all().prefetch_related(
+        Prefetch(
+            'products',
+            queryset=ProductSerializer.setup_queryset(
+                Product.active.all(), ProductSerializer.list_fields + ['category']
+            ),
+        )
+    )
     serializer_class = CategoryDetailSerializer
     permission_classes = []
     lookup_field = 'slug'
\ No newline at end of file
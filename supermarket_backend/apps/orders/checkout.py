@@ -0,0 +1,100 @@
+from apps.cart.models import Cart, CartItem
+from apps.cart.storage import get_cart_store
+from apps.products.stock import OutOfStock, release_stock, reserve_stock
+from apps.promotions.engine import PricedLine, get_rule_set, redeem
+from django.db import transaction
+from django.utils import timezone
+
+from .ids import get_order_id_generator
+from .models import Order, OrderItem
+
+# orders past these have left the warehouse and can no longer be cancelled
+CANCELLABLE_STATUSES = ("pending", "processing")
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, product_ids=()):
+        super().__init__(message)
+        self.product_ids = list(product_ids)
+
+
+def place_order(user, promo_code=None, store=None):
+    """
+    Turn the user's cart into an order and return `(order, quote)`.
+
+    Runs as one transaction with a fixed number of queries whatever the cart size:
+    lines and prices are read in one query, items are bulk inserted and the cart
+    is cleared with a single DELETE. Stock-tracked products add one guarded
+    decrement each, and the promotion applied (the best of the automatic ones and
+    `promo_code`) one counter update. A failure anywhere leaves the cart, stock and
+    promotion counters untouched. Derived indexes such as co-purchases are updated
+    by background jobs, not here.
+    """
+    store = store or get_cart_store()
+    store.flush([user])
+    # issued outside the transaction: a fresh process leases its worker id here
+    order_id = get_order_id_generator().generate()
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().filter(user=user).first()
+        lines = []
+        if cart is not None:
+            rows = list(
+                CartItem.objects.filter(cart=cart, product__is_active=True)
+                .order_by("id")
+                .values_list("product_id", "product__category_id", "quantity", "product__price", "product__image")
+            )
+            lines = [PricedLine(*row[:4]) for row in rows]
+        if not lines:
+            raise CheckoutError("Cart is empty")
+
+        try:
+            reserve_stock({line.product_id: line.quantity for line in lines})
+        except OutOfStock as error:
+            raise CheckoutError("Some products are out of stock", error.product_ids)
+
+        rules = get_rule_set()
+        used_up = set()
+        while True:
+            quote = rules.evaluate(lines, code=promo_code, exclude=used_up)
+            if quote.promotion is None or redeem(quote.promotion, user):
+                break
+            used_up.add(quote.promotion.id)
+
+        order = Order.objects.create(
+            user=user,
+            order_id=order_id,
+            total=quote.total,
+            status="pending",
+            item_count=sum(line.quantity for line in lines),
+            thumbnail=rows[0][4],
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product_id=line.product_id, quantity=line.quantity, price=line.price)
+                for line in lines
+            ]
+        )
+        store.clear(user)
+    return order, quote
+
+
+def cancel_order(order):
+    """
+    Mark `order` cancelled and return its items to stock.
+
+    Returns False if the order was already cancelled or is past the cancellable
+    statuses. The status change is a guarded UPDATE, so concurrent cancels
+    release stock once.
+    """
+    with transaction.atomic():
+        cancelled = Order.objects.filter(pk=order.pk, status__in=CANCELLABLE_STATUSES).update(
+            status="cancelled", updated_at=timezone.now()
+        )
+        if not cancelled:
+            return False
+        items = {}
+        for product_id, quantity in order.items.values_list("product_id", "quantity"):
+            items[product_id] = items.get(product_id, 0) + quantity
+        release_stock(items)
+    order.status = "cancelled"
+    return True
@@ -0,0 +1,116 @@
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def to_base36(number, width):
+    digits = []
+    while number:
+        number, remainder = divmod(number, 36)
+        digits.append(ALPHABET[remainder])
+    return "".join(reversed(digits)).rjust(width, "0")
+
+
+class OrderIdGenerator:
+    """
+    Interface every order id generator implements.
+    """
+
+    def generate(self):
+        """
+        Return a new, never before issued `order_id` (at most 20 characters).
+        """
+        raise NotImplementedError
+
+
+class SnowflakeGenerator(OrderIdGenerator):
+    """
+    Time-ordered 63-bit ids, built without touching the database per id.
+
+    Each id packs milliseconds since `epoch`, a worker id and a per-millisecond
+    sequence, so generators with distinct worker ids never collide. The number is
+    rendered as `ORD-` plus 13 zero-padded base36 digits, which sort in creation
+    order. The worker id comes from `ORDER_ID_WORKER_ID`; without it each process
+    leases one from the database the first time it issues an id.
+    """
+    prefix = "ORD-"
+    width = 13
+    worker_bits = 10
+    sequence_bits = 12
+    epoch = 1704067200000  # 2024-01-01T00:00:00Z, in milliseconds
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self):
+        worker_id = self.worker_id
+        if worker_id is None:
+            worker_id = getattr(settings, "ORDER_ID_WORKER_ID", None)
+        if worker_id is None:
+            worker_id = lease_worker_id()
+        self._worker = worker_id & ((1 << self.worker_bits) - 1)
+        self._last = -1
+        self._sequence = 0
+        self._pid = os.getpid()
+
+    def next_id(self):
+        with self._lock:
+            # a forked child must not continue its parent's sequence
+            if self._pid != os.getpid():
+                self._reset()
+            now = int(time.time() * 1000) - self.epoch
+            if now > self._last:
+                self._last, self._sequence = now, 0
+            else:
+                # same millisecond, or the clock stepped back: keep counting from
+                # the last timestamp, borrowing the next millisecond on overflow
+                self._sequence = (self._sequence + 1) & ((1 << self.sequence_bits) - 1)
+                if self._sequence == 0:
+                    self._last += 1
+            return (
+                (self._last << (self.worker_bits + self.sequence_bits))
+                | (self._worker << self.sequence_bits)
+                | self._sequence
+            )
+
+    def generate(self):
+        return f"{self.prefix}{to_base36(self.next_id(), self.width)}"
+
+
+def lease_worker_id():
+    """
+    Claim a worker id for this process by inserting an `OrderIdWorker` row.
+
+    Row ids come from the database sequence, so concurrent processes on any host
+    get distinct ids; the worker id is the row id modulo 1024, unique among the
+    last 1024 processes that started. Call it outside a transaction that may roll
+    back, as SQLite reuses rolled back row ids.
+    """
+    from .models import OrderIdWorker
+
+    return OrderIdWorker.objects.create(hostname=socket.gethostname()[:255], pid=os.getpid()).id
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_order_id_generator():
+    """
+    Return this process's generator; it is shared because it carries sequence state.
+    """
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                path = getattr(settings, "ORDER_ID_GENERATOR", "apps.orders.ids.SnowflakeGenerator")
+                _generator = import_string(path)()
+    return _generator
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...ids import get_order_id_generator
+
+
+class Command(BaseCommand):
+    help = "Measures how many order ids this process's generator issues per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        if count < 1:
+            raise CommandError("count must be >= 1")
+        generator = get_order_id_generator()
+        # the first id leases a worker id; keep that round trip out of the timing
+        first = generator.generate()
+        started = time.perf_counter()
+        ids = [generator.generate() for _ in range(count)]
+        elapsed = time.perf_counter() - started
+
+        if ids != sorted(ids) or len(set(ids)) != count or ids[0] <= first:
+            raise CommandError("order ids were repeated or out of order")
+        self.stdout.write(self.style.SUCCESS(f"{count / elapsed:,.0f} order ids/sec over {count} ids"))
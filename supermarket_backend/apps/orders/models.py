@@ -16,9 +16,17 @@ class Order(models.Model):
     order_id = models.CharField(max_length=20, unique=True)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending')
+    # Denormalised at checkout so order history rows never load items.
+    item_count = models.PositiveIntegerField(default=0)
+    thumbnail = models.URLField(blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_history_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.order_id} by {self.user.email}"
 
@@ -33,4 +41,15 @@ class OrderItem(models.Model):
 
     @property
     def total_price(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+class OrderIdWorker(models.Model):
+    """
+    A process that issued order ids; `id % 1024` is its Snowflake worker id.
+    """
+    hostname = models.CharField(max_length=255)
+    pid = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Worker {self.id} ({self.hostname}:{self.pid})"
@@ -0,0 +1,13 @@
+from core.pagination import KeysetPagination
+
+
+class OrderHistoryPagination(KeysetPagination):
+    """
+    Cursor pagination for a user's orders, backed by the `(user, created_at, id)` index.
+    """
+    ordering_fields = ("created_at",)
+    ordering_aliases = {
+        "newest": "-created_at",
+        "oldest": "created_at",
+    }
+    default_ordering = "-created_at"
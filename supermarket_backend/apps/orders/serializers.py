@@ -5,7 +5,7 @@ from .models import Order, OrderItem
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = ProductSerializer(read_only=True, fields=ProductSerializer.list_fields)
     total_price = serializers.SerializerMethodField()
 
     class Meta:
@@ -16,19 +16,20 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return obj.total_price
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)
+class OrderListSerializer(serializers.ModelSerializer):
+    """
+    Order history row, served from the order's own columns.
+    """
 
     class Meta:
         model = Order
         fields = [
             "order_id",
-            "user",
-            "total",
             "status",
+            "total",
+            "item_count",
+            "thumbnail",
             "created_at",
-            "updated_at",
-            "items",
         ]
 
 
@@ -41,6 +42,7 @@ class OrderDetailSerializer(serializers.ModelSerializer):
             "order_id",
             "status",
             "total",
+            "item_count",
             "created_at",
             "items",
         ]
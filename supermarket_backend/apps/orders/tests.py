@@ -1,3 +1,249 @@
-from django.test import TestCase
+import io
+import multiprocessing
+from decimal import Decimal
+from unittest import mock
 
+from apps.cart.models import Cart, CartItem
+from apps.products.models import Product
+from apps.products.stock import get_stock, set_stock
+from apps.promotions.engine import get_rule_set
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
+from .ids import SnowflakeGenerator
+from .models import Order, OrderIdWorker, OrderItem
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, lines):
+        products = Product.objects.bulk_create(
+            [
+                Product(name=f"Product {i}", price=Decimal("0.10") * (i + 1), description="", image="http://example.com/p.png")
+                for i in range(lines)
+            ]
+        )
+        CartItem.objects.bulk_create(
+            [CartItem(cart=self.cart, product=product, quantity=3) for product in products]
+        )
+        return products
+
+    def checkout(self, **data):
+        return self.client.post("/api/orders/checkout/", data, format="json")
+
+    def test_creates_order_and_clears_cart(self):
+        products = self.fill_cart(3)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal("1.80"))
+        self.assertEqual(
+            sorted(order.items.values_list("product_id", "quantity", "price")),
+            [(product.id, 3, product.price) for product in products],
+        )
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_discount_is_exact_decimal(self):
+        self.fill_cart(3)
+
+        response = self.checkout(promo_code="DISCOUNT20")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data["discount"]), Decimal("0.36"))
+        self.assertEqual(Order.objects.get().total, Decimal("1.44"))
+
+    def test_empty_cart_is_rejected(self):
+        self.assertEqual(self.checkout().status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failure_leaves_cart_intact(self):
+        self.fill_cart(2)
+
+        with mock.patch.object(OrderItem.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.checkout()
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_out_of_stock_rejects_checkout(self):
+        products = self.fill_cart(2)
+        set_stock(products[0].id, 5)
+        set_stock(products[1].id, 2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["product_ids"], [products[1].id])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertEqual(get_stock([products[0].id]), {products[0].id: 5})
+
+    def test_cancel_releases_stock_once(self):
+        product = self.fill_cart(1)[0]
+        set_stock(product.id, 5)
+        self.checkout()
+        order = Order.objects.get()
+        self.assertEqual(get_stock([product.id]), {product.id: 2})
+
+        url = f"/api/orders/{order.order_id}/update-status/"
+        self.assertEqual(self.client.patch(url, {"status": "cancelled"}, format="json").status_code, 200)
+        self.assertEqual(self.client.patch(url, {"status": "cancelled"}, format="json").status_code, 200)
+        self.assertEqual(get_stock([product.id]), {product.id: 5})
+
+    def test_status_changes_are_limited_by_role_and_status(self):
+        self.fill_cart(1)
+        self.checkout()
+        order = Order.objects.get()
+        url = f"/api/orders/{order.order_id}/update-status/"
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            email="other@example.com", name="Other", password="secret"
+        ))
+        staff = APIClient()
+        staff.force_authenticate(get_user_model().objects.create_user(
+            email="staff@example.com", name="Staff", password="secret", is_staff=True
+        ))
+
+        self.assertEqual(other.patch(url, {"status": "cancelled"}, format="json").status_code, 404)
+        self.assertEqual(self.client.patch(url, {"status": "shipped"}, format="json").status_code, 403)
+        self.assertEqual(staff.patch(url, {"status": "shipped"}, format="json").status_code, 200)
+        self.assertEqual(self.client.patch(url, {"status": "cancelled"}, format="json").status_code, 409)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "shipped")
+
+    def test_cost_is_flat_in_cart_size(self):
+        queries = {}
+        get_rule_set()  # compiled once per process, not per checkout
+        for lines in (1, 20, 200):
+            self.fill_cart(lines)
+            # on-commit work runs inside the request too, so it is counted
+            with CaptureQueriesContext(connection) as captured, self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.checkout().status_code, 201)
+            queries[lines] = len(captured)
+
+        self.assertEqual(queries[1], queries[20])
+        self.assertEqual(queries[1], queries[200])
+
+
+def generate_ids(worker_id, count=20000):
+    generator = SnowflakeGenerator(worker_id=worker_id)
+    return [generator.generate() for _ in range(count)]
+
+
+class SnowflakeGeneratorTests(SimpleTestCase):
+    def test_ids_are_ordered_and_fit_the_column(self):
+        ids = generate_ids(worker_id=1, count=5000)
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(len(order_id) == 17 and order_id.startswith("ORD-") for order_id in ids))
+        self.assertLessEqual(len(ids[0]), Order._meta.get_field("order_id").max_length)
+
+    def test_sequence_overflow_borrows_the_next_millisecond(self):
+        generator = SnowflakeGenerator(worker_id=1)
+        # a frozen clock: one millisecond only holds 4096 sequence numbers
+        with mock.patch("apps.orders.ids.time.time", return_value=1800000000.0):
+            ids = [generator.generate() for _ in range(5000)]
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+
+def lease_and_generate(count):
+    # a forked child opens its own connection and leases like a fresh process
+    connection.close()
+    try:
+        generator = SnowflakeGenerator()
+        return [generator.generate() for _ in range(count)]
+    finally:
+        connection.close()
+
+
+@override_settings(ORDER_ID_WORKER_ID=None)
+class WorkerLeaseProcessTests(TransactionTestCase):
+    def test_processes_lease_distinct_worker_ids(self):
+        processes = 4
+        connection.close()
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            batches = pool.map(lease_and_generate, [20000] * processes)
+
+        self.assertEqual(OrderIdWorker.objects.count(), processes)
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch))
+        ids = [order_id for batch in batches for order_id in batch]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_bench_command_reports_the_rate(self):
+        output = io.StringIO()
+        call_command("bench_order_ids", count=5000, stdout=output)
+        self.assertRegex(output.getvalue(), r"[\d,]+ order ids/sec over 5000 ids")
+
+
+class WorkerLeaseTests(TestCase):
+    @override_settings(ORDER_ID_WORKER_ID=None)
+    def test_processes_without_a_worker_id_lease_distinct_ones(self):
+        # process ids that agree modulo 1024, issuing ids in the same millisecond
+        ids = []
+        with mock.patch("apps.orders.ids.time.time", return_value=1800000000.0):
+            for pid in (5, 1029):
+                with mock.patch("apps.orders.ids.os.getpid", return_value=pid):
+                    ids.append(SnowflakeGenerator().generate())
+
+        self.assertNotEqual(ids[0], ids[1])
+        self.assertEqual(sorted(OrderIdWorker.objects.values_list("pid", flat=True)), [5, 1029])
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="shopper@example.com", name="Shopper", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+        products = Product.objects.bulk_create(
+            [
+                Product(name=f"Product {i}", price="2.00", description="", image=f"http://example.com/{i}.png")
+                for i in range(3)
+            ]
+        )
+        for _ in range(5):
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product=product, quantity=2) for product in products]
+            )
+            self.client.post("/api/orders/checkout/", {}, format="json")
+
+    def test_list_is_keyset_paginated_without_items(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/orders/", {"page_size": 3})
+        order = response.data["results"][0]
+        self.assertEqual((order["item_count"], order["thumbnail"]), (6, "http://example.com/0.png"))
+        self.assertNotIn("items", order)
+
+        second = self.client.get(response.data["next"])
+        ids = [row["order_id"] for row in response.data["results"] + second.data["results"]]
+        self.assertEqual(ids, list(Order.objects.order_by("-created_at", "-id").values_list("order_id", flat=True)))
+        self.assertIsNone(second.data["next"])
+
+    def test_detail_loads_items_in_fixed_queries(self):
+        order = Order.objects.first()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/orders/{order.order_id}/")
+
+        self.assertEqual(len(response.data["items"]), 3)
+        self.assertEqual(response.data["items"][0]["product"]["name"], "Product 0")
@@ -1,22 +1,26 @@
-from apps.cart.models import Cart, CartItem
+from apps.products.serializers import ProductSerializer
+from django.db.models import Prefetch
+from django.utils import timezone
 from rest_framework import generics, status
 from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from .checkout import CheckoutError, cancel_order, place_order
 from .models import Order, OrderItem
-from .serializers import OrderDetailSerializer, OrderSerializer
+from .pagination import OrderHistoryPagination
+from .serializers import OrderDetailSerializer, OrderListSerializer
 
 
 class OrderListView(generics.ListAPIView):
-    serializer_class = OrderSerializer
+    serializer_class = OrderListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryPagination
 
     def get_queryset(self):
-        queryset = Order.objects.filter(user=self.request.user)
-        print("QuerySet:", queryset)
-        print("Serialized Data:", OrderSerializer(queryset, many=True).data)
-        return queryset
+        return Order.objects.filter(user=self.request.user).only(
+            "id", "created_at", *OrderListSerializer.Meta.fields
+        )
 
 
 class OrderDetailView(APIView):
@@ -24,8 +28,14 @@ class OrderDetailView(APIView):
     lookup_field = "order_id"
 
     def get(self, request, order_id):
+        items = OrderItem.objects.select_related("product").only(
+            "order_id", "quantity", "price",
+            *(f"product__{field}" for field in ProductSerializer.list_fields),
+        )
         try:
-            order = Order.objects.get(order_id=order_id, user=request.user)
+            order = Order.objects.prefetch_related(Prefetch("items", queryset=items)).get(
+                order_id=order_id, user=request.user
+            )
             serializer = OrderDetailSerializer(order)
             return Response(serializer.data)
         except Order.DoesNotExist:
@@ -39,70 +49,75 @@ class CheckoutView(CreateAPIView):
         pass
 
     def post(self, request, *args, **kwargs):
-        user = request.user
-        cart = Cart.objects.filter(user=user).first()
-        print(user, cart)
-
-        if not cart or not cart.items.exists():
-            return Response(
-                {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
-            )
-
-        promo_code = request.data.get("promo_code")
-        total = sum(item.total_price for item in cart.items.all())
-        discount = 0
-
-        if promo_code == "DISCOUNT20":
-            discount = total * 0.2
-            total -= discount
-
-        order = Order.objects.create(
-            user=user,
-            order_id=f"ORD-{user.id}-{Order.objects.count() + 1}",
-            total=total,
-            status="pending",
-        )
-
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price,
-            )
-
-        cart.items.all().delete()
+        try:
+            order, quote = place_order(request.user, request.data.get("promo_code"))
+        except CheckoutError as error:
+            body = {"error": str(error)}
+            if error.product_ids:
+                body["product_ids"] = error.product_ids
+            return Response(body, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(
             {
                 "message": "Order created successfully",
                 "order_id": order.order_id,
-                "total": total,
-                "discount": discount,
+                "total": order.total,
+                "discount": quote.discount,
+                "promotion": quote.promotion and (quote.promotion.code or quote.promotion.name),
             },
             status=status.HTTP_201_CREATED,
         )
 
 
 class UpdateOrderStatusView(generics.UpdateAPIView):
+    """
+    Customers may cancel their own pending or processing orders; every other
+    status change is for admins only.
+    """
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, *args, **kwargs):
         order_id = kwargs.get("order_id")
-        status = request.data.get("status")
+        new_status = request.data.get("status")
 
-        try:
-            order = Order.objects.get(order_id=order_id)
-            order.status = status
-            order.save()
+        if new_status not in dict(Order.ORDER_STATUS_CHOICES):
             return Response(
-                {"message": "Order status updated"}, status=status.HTTP_200_OK
+                {"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST
             )
+
+        orders = Order.objects.all()
+        if not request.user.is_staff:
+            orders = orders.filter(user=request.user)
+        try:
+            order = orders.get(order_id=order_id)
         except Order.DoesNotExist:
             return Response(
                 {"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
+        if new_status == "cancelled":
+            # cancelling releases the order's stock, so it must happen exactly once
+            if not cancel_order(order) and not Order.objects.filter(pk=order.pk, status="cancelled").exists():
+                return Response(
+                    {"error": "Only pending or processing orders can be cancelled"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+        elif not request.user.is_staff:
+            return Response(
+                {"error": "Only staff can change an order's status"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        elif not Order.objects.filter(pk=order.pk).exclude(status="cancelled").update(
+            status=new_status, updated_at=timezone.now()
+        ):
+            return Response(
+                {"error": "Cancelled orders cannot be changed"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(
+            {"message": "Order status updated"}, status=status.HTTP_200_OK
+        )
+
 
 class DeliveryTimesView(APIView):
     def get(self, request, *args, **kwargs):
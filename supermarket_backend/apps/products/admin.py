@@ -1,15 +1,19 @@
 from django.contrib import admin
-from .models import Product, Review
+from .models import Product, Review, StockShard
 
 class ReviewInline(admin.TabularInline):
     model = Review
     extra = 1  
 
+class StockShardInline(admin.TabularInline):
+    model = StockShard
+    extra = 0
+
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'rating', 'organic', 'origin')
+    list_display = ('name', 'price', 'rating', 'review_count', 'organic', 'origin')
     list_filter = ('organic', 'origin')
-    search_fields = ('name', 'description')
-    inlines = [ReviewInline]  
+    search_fields = ('name', 'sku', 'description')
+    inlines = [StockShardInline, ReviewInline]
 
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Review)
\ No newline at end of file
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Q, Sum, When
+from django.db.models.functions import Cast, Now
+from django.utils import timezone
+
+from .models import Product, Review
+
+HISTOGRAM_FIELDS = {stars: f'rating_{stars}_count' for stars in range(1, 6)}
+
+
+def apply_review_delta(product_id, rating, delta):
+    """
+    Add (`delta=1`) or remove (`delta=-1`) one review from a product's aggregates.
+
+    Runs as a single UPDATE built from F-expressions, so concurrent review writes
+    never read-modify-write the product row. `rating` is refreshed to the new mean
+    in the same statement; it is left untouched once the last review is gone.
+    """
+    count = F('review_count') + delta
+    total = F('rating_sum') + rating * delta
+    histogram_field = HISTOGRAM_FIELDS[rating]
+    Product.objects.filter(pk=product_id).update(
+        review_count=count,
+        rating_sum=total,
+        rating=Case(
+            When(review_count__gt=-delta, then=Cast(total, FloatField()) / Cast(count, FloatField())),
+            default=F('rating'),
+        ),
+        updated_at=Now(),
+        **{histogram_field: F(histogram_field) + delta},
+    )
+
+
+def apply_review_vote(review_id, value):
+    """
+    Count one up (`value=1`) or down (`value=-1`) vote on a review.
+
+    The counter and the stored helpfulness move together in one UPDATE, so the
+    helpful-first feed ordering is correct as soon as the vote commits.
+    """
+    counter = 'upvotes' if value > 0 else 'downvotes'
+    return Review.objects.filter(pk=review_id).update(
+        helpfulness=F('helpfulness') + value,
+        **{counter: F(counter) + 1},
+    )
+
+
+def rebuild_review_aggregates(batch_size=1000, product_model=Product, review_model=Review):
+    """
+    Recompute every product's review aggregates from the reviews table.
+
+    Takes the model classes so the data migration can pass its historical models.
+    Only products whose aggregates were wrong are written, and they get a new
+    `updated_at` where the model has one so incremental exports and indexes pick
+    them up. Returns the number of products that have at least one review.
+    """
+    histogram = {
+        field: Count('id', filter=Q(rating=stars)) for stars, field in HISTOGRAM_FIELDS.items()
+    }
+    rows = (
+        review_model.objects.order_by()
+        .values('product_id')
+        .annotate(review_count=Count('id'), rating_sum=Sum('rating'), **histogram)
+    )
+    update_fields = ['review_count', 'rating_sum', 'rating', *HISTOGRAM_FIELDS.values()]
+    stamp = any(field.name == 'updated_at' for field in product_model._meta.get_fields())
+    written_fields = [*update_fields, 'updated_at'] if stamp else update_fields
+
+    def write(batch):
+        stored = {
+            row[0]: row[1:]
+            for row in product_model.objects.filter(pk__in=batch).values_list('pk', *update_fields)
+        }
+        now = timezone.now()
+        changed = []
+        for product_id, row in batch.items():
+            if stored.get(product_id) != tuple(row[field] for field in update_fields):
+                product = product_model(pk=product_id, **row)
+                if stamp:
+                    product.updated_at = now
+                changed.append(product)
+        product_model.objects.bulk_update(changed, written_fields)
+
+    zeroed = {'review_count': 0, 'rating_sum': 0, **{field: 0 for field in HISTOGRAM_FIELDS.values()}}
+    reviewed = 0
+    with transaction.atomic():
+        product_model.objects.filter(
+            ~Exists(review_model.objects.filter(product_id=OuterRef('pk')))
+        ).exclude(**zeroed).update(**(dict(zeroed, updated_at=timezone.now()) if stamp else zeroed))
+
+        batch = {}
+        for row in rows.iterator(chunk_size=batch_size):
+            product_id = row.pop('product_id')
+            row['rating'] = row['rating_sum'] / row['review_count']
+            batch[product_id] = row
+            if len(batch) >= batch_size:
+                write(batch)
+                reviewed += len(batch)
+                batch = {}
+        write(batch)
+        reviewed += len(batch)
+    return reviewed
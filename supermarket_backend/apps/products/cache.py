@@ -0,0 +1,85 @@
+from hashlib import md5
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from apps.categories.models import Category
+from core.cache import bump_version, get_or_build, get_version, touch_markers
+
+from .models import Product
+
+CACHE_TIMEOUT = getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 300)
+
+PRODUCTS_MARKER = 'products'
+CATEGORIES_MARKER = 'categories'
+
+
+def category_marker(slug):
+    return f'category:{slug}'
+
+
+def touch_catalog_markers(category_ids=(), slugs=(), categories=False):
+    """
+    Record a product-table write, plus a write to each affected category's listing.
+    """
+    slugs = set(slugs)
+    category_ids = {category_id for category_id in category_ids if category_id}
+    if category_ids:
+        slugs.update(Category.objects.filter(id__in=category_ids).values_list('slug', flat=True))
+    names = [PRODUCTS_MARKER, *(category_marker(slug) for slug in slugs)]
+    if categories:
+        names.append(CATEGORIES_MARKER)
+    touch_markers(*names)
+
+
+def product_version_name(product_id):
+    return f'product:{product_id}'
+
+
+def invalidate_product(*product_ids):
+    bump_version(*(product_version_name(product_id) for product_id in product_ids if product_id))
+
+
+def invalidate_products_changed_since(since):
+    """
+    Invalidate the cached payloads and listings of every product written since `since`.
+
+    For bulk repairs, which stamp `updated_at` on the rows they change but send no signals.
+    """
+    rows = list(Product.objects.filter(updated_at__gte=since).values_list('id', 'category_id'))
+    if rows:
+        invalidate_product(*(product_id for product_id, _ in rows))
+        touch_catalog_markers(category_ids={category_id for _, category_id in rows})
+
+
+def product_cache_key(product_id, name, request):
+    """
+    Key a cached payload by product version, endpoint, origin and normalised query string.
+
+    Payloads embed absolute pagination links, so the scheme and host are part of the key.
+    """
+    query = '&'.join(sorted(request.query_params.urlencode().split('&')))
+    origin = f'{request.scheme}://{request.get_host()}'
+    digest = md5(f'{origin}?{query}'.encode('utf-8'), usedforsecurity=False).hexdigest()
+    version = get_version(product_version_name(product_id))
+    return f'product:{product_id}:v{version}:{name}:{digest}'
+
+
+class ProductCacheMixin:
+    """
+    Serve GET responses from the per-product versioned cache.
+
+    Product and review writes bump the product's version, which orphans every
+    cached payload for it. Data embedded from *other* products (e.g. related
+    products) is only refreshed when the entry expires.
+    """
+    cache_name = None
+
+    def get(self, request, *args, **kwargs):
+        key = product_cache_key(kwargs['id'], self.cache_name, request)
+        data = get_or_build(
+            key,
+            lambda: super(ProductCacheMixin, self).get(request, *args, **kwargs).data,
+            timeout=CACHE_TIMEOUT,
+        )
+        return Response(data)
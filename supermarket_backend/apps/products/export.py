@@ -0,0 +1,70 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product
+from .nutrition import NUTRIENTS
+
+BASE_COLUMNS = [
+    'id', 'sku', 'name', 'price', 'rating', 'review_count', 'description', 'image',
+    'weight', 'origin', 'organic', 'storage', 'is_active', 'updated_at',
+]
+CATEGORY_COLUMNS = ['category_id', 'category_slug', 'category_name']
+INCLUDES = ('category', 'nutrition')
+
+
+def export_columns(include):
+    columns = list(BASE_COLUMNS)
+    if 'category' in include:
+        columns += CATEGORY_COLUMNS
+    if 'nutrition' in include:
+        columns += NUTRIENTS
+    return columns
+
+
+def export_queryset(include, since=None):
+    """
+    Products to export, oldest change first so `since` works as a resume point.
+
+    Every product write path, bulk commands included, moves `updated_at`. Category
+    renames do not, so the category columns of unchanged products only refresh
+    with a full export.
+    """
+    lookups = {
+        'category_id': 'category_id',
+        'category_slug': 'category__slug',
+        'category_name': 'category__name',
+    }
+    columns = export_columns(include)
+    queryset = Product.objects.order_by('updated_at', 'id')
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    return queryset.values_list(*(lookups.get(column, column) for column in columns)), columns
+
+
+def iter_rows(include, since=None, chunk_size=2000):
+    queryset, columns = export_queryset(include, since)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(columns, row))
+
+
+def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back, for streaming csv.writer output.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.DictWriter(Echo(), fieldnames=columns)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
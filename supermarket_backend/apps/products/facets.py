@@ -0,0 +1,357 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from core.cache import get_markers, get_version
+
+from .models import Product
+from .nutrition import NUTRIENTS
+
+# Bumping the version rebuilds every worker's index; touching the marker makes
+# them fold in the products written since their last refresh.
+CATALOG_VERSION = 'catalog'
+FACETS_MARKER = 'facets'
+
+PRICE_BUCKETS = [
+    ('0-5', Decimal('0'), Decimal('5')),
+    ('5-10', Decimal('5'), Decimal('10')),
+    ('10-20', Decimal('10'), Decimal('20')),
+    ('20-50', Decimal('20'), Decimal('50')),
+    ('50+', Decimal('50'), None),
+]
+RATING_BUCKETS = [('4+', 4.0), ('3+', 3.0), ('2+', 2.0), ('1+', 1.0)]
+
+FACETS = ('category', 'organic', 'origin', 'price', 'rating')
+VALUE_FACETS = ('category', 'organic', 'origin')
+RANGE_FIELDS = ('price', 'rating', *NUTRIENTS)
+COLUMNS = ('category__slug', 'organic', 'origin', *RANGE_FIELDS)
+
+
+def parse_facet_filters(params):
+    """
+    Read facet filters from query parameters.
+
+    `category` and `origin` take comma-separated values (any of them matches),
+    `organic` takes true/false, and price/rating take `min_`/`max_` bounds.
+    """
+    def split(name):
+        value = params.get(name, '')
+        return [part.strip() for part in value.split(',') if part.strip()]
+
+    def number(name, cast):
+        try:
+            return cast(params[name])
+        except (KeyError, ValueError, TypeError, InvalidOperation):
+            return None
+
+    filters = {}
+    if split('category'):
+        filters['category'] = split('category')
+    if split('origin'):
+        filters['origin'] = split('origin')
+    organic = params.get('organic', '').lower()
+    if organic in ('true', '1', 'false', '0'):
+        filters['organic'] = organic in ('true', '1')
+    price = (number('min_price', Decimal), number('max_price', Decimal))
+    if price != (None, None):
+        filters['price'] = price
+    rating = (number('min_rating', float), number('max_rating', float))
+    if rating != (None, None):
+        filters['rating'] = rating
+    return filters
+
+
+def apply_facet_filters(queryset, filters):
+    if 'category' in filters:
+        queryset = queryset.filter(category__slug__in=filters['category'])
+    if 'origin' in filters:
+        queryset = queryset.filter(origin__in=filters['origin'])
+    if 'organic' in filters:
+        queryset = queryset.filter(organic=filters['organic'])
+    for facet in ('price', 'rating'):
+        low, high = filters.get(facet, (None, None))
+        if low is not None:
+            queryset = queryset.filter(**{f'{facet}__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{f'{facet}__lte': high})
+    return queryset
+
+
+def bitmap_from_positions(positions):
+    """
+    Build the int with the given bits set.
+
+    Bits are set in a byte buffer converted once, rather than OR-ing one big int
+    per position, which would copy the whole bitmap each time.
+    """
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def bucket_labels(facet, value):
+    """
+    Return the price or rating buckets `value` is counted in.
+    """
+    if value is None:
+        return ()
+    if facet == 'price':
+        return tuple(label for label, low, high in PRICE_BUCKETS if value >= low and (high is None or value < high))
+    return tuple(label for label, low in RATING_BUCKETS if value >= low)
+
+
+def rating_buckets(product_ids, lock=False):
+    """
+    Map each product to its rating buckets, to tell whether a review write moved it.
+    """
+    products = Product.objects.filter(id__in=product_ids)
+    if lock:
+        products = products.select_for_update()
+    return {
+        product_id: bucket_labels('rating', rating)
+        for product_id, rating in products.values_list('id', 'rating')
+    }
+
+
+def value_facets(values):
+    category, organic, origin = values[:3]
+    if category:
+        yield 'category', category
+    yield 'organic', bool(organic)
+    if origin:
+        yield 'origin', origin
+
+
+class FacetIndex:
+    """
+    In-memory bitmap index over the active catalog.
+
+    Every product gets a bit position; each facet value maps to a Python int with
+    the bits of the products that have it. Filtering is AND/OR over those ints and
+    a facet count is a popcount, so counting every facet for a filter costs a few
+    big-int operations instead of a GROUP BY per facet. Product writes are folded
+    in incrementally from `updated_at`; a deactivated product keeps its position
+    with every bit cleared.
+    """
+    max_cached_ranges = 256
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+        self.rows = {}
+        self.values = {facet: {} for facet in VALUE_FACETS}
+        self.sorted = {field: [] for field in RANGE_FIELDS}
+        self.keys = {field: [] for field in RANGE_FIELDS}
+        self.buckets = {'price': {}, 'rating': {}}
+        self.all = 0
+        self.watermark = None
+        self._ranges = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        members = {facet: defaultdict(list) for facet in VALUE_FACETS}
+        pairs = {field: [] for field in RANGE_FIELDS}
+        rows = Product.active.order_by('id').values_list('id', 'updated_at', *COLUMNS)
+        for product_id, updated_at, *values in rows.iterator(chunk_size=5000):
+            position = len(index.ids)
+            index.ids.append(product_id)
+            index.positions[product_id] = position
+            index.rows[product_id] = values
+            for facet, value in value_facets(values):
+                members[facet][value].append(position)
+            for field, value in zip(RANGE_FIELDS, values[3:]):
+                if value is not None:
+                    pairs[field].append((value, position))
+            if index.watermark is None or updated_at > index.watermark:
+                index.watermark = updated_at
+        index.all = (1 << len(index.ids)) - 1
+        index.values = {
+            facet: {value: bitmap_from_positions(positions) for value, positions in values.items()}
+            for facet, values in members.items()
+        }
+        index.sorted = {field: sorted(field_pairs) for field, field_pairs in pairs.items()}
+        index.keys = {field: [value for value, _ in field_pairs] for field, field_pairs in index.sorted.items()}
+        index.buckets = {
+            'price': {label: index.range_bitmap('price', low, high, inclusive=False) for label, low, high in PRICE_BUCKETS},
+            'rating': {label: index.range_bitmap('rating', low, None) for label, low in RATING_BUCKETS},
+        }
+        return index
+
+    def copy(self):
+        index = type(self)()
+        index.ids = list(self.ids)
+        index.positions = dict(self.positions)
+        index.rows = dict(self.rows)
+        index.values = {facet: dict(values) for facet, values in self.values.items()}
+        index.sorted = {field: list(pairs) for field, pairs in self.sorted.items()}
+        index.keys = {field: list(keys) for field, keys in self.keys.items()}
+        index.buckets = {facet: dict(buckets) for facet, buckets in self.buckets.items()}
+        index.all = self.all
+        index.watermark = self.watermark
+        return index
+
+    def _flip(self, position, values, add):
+        bit = 1 << position
+
+        def flip(bitmap):
+            return bitmap | bit if add else bitmap & ~bit
+
+        for facet, value in value_facets(values):
+            bitmap = flip(self.values[facet].get(value, 0))
+            if bitmap:
+                self.values[facet][value] = bitmap
+            else:
+                self.values[facet].pop(value, None)
+        for field, value in zip(RANGE_FIELDS, values[3:]):
+            if value is None:
+                continue
+            pairs, keys = self.sorted[field], self.keys[field]
+            at = bisect_left(pairs, (value, position))
+            if add:
+                pairs.insert(at, (value, position))
+                keys.insert(at, value)
+            elif at < len(pairs) and pairs[at] == (value, position):
+                del pairs[at]
+                del keys[at]
+            if field in self.buckets:
+                for label in bucket_labels(field, value):
+                    self.buckets[field][label] = flip(self.buckets[field].get(label, 0))
+        self.all = flip(self.all)
+
+    def refresh(self):
+        """
+        Fold in products written since the last build or refresh.
+
+        Mutates the index in place; callers serving requests refresh a `copy()`.
+        """
+        changed = Product.objects.values_list('id', 'is_active', 'updated_at', *COLUMNS)
+        if self.watermark is not None:
+            changed = changed.filter(updated_at__gte=self.watermark)
+        changed = list(changed)
+        for product_id, is_active, updated_at, *values in changed:
+            previous = self.rows.pop(product_id, None)
+            if previous is not None:
+                self._flip(self.positions[product_id], previous, add=False)
+            if is_active:
+                if product_id not in self.positions:
+                    self.positions[product_id] = len(self.ids)
+                    self.ids.append(product_id)
+                self.rows[product_id] = values
+                self._flip(self.positions[product_id], values, add=True)
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+        self._ranges.clear()
+        return len(changed)
+
+    def range_bitmap(self, facet, low, high, inclusive=True):
+        key = (facet, low, high, inclusive)
+        if key in self._ranges:
+            return self._ranges[key]
+        keys, pairs = self.keys[facet], self.sorted[facet]
+        start = 0 if low is None else bisect_left(keys, low)
+        if high is None:
+            end = len(keys)
+        else:
+            end = bisect_right(keys, high) if inclusive else bisect_left(keys, high)
+        bitmap = bitmap_from_positions(position for _, position in pairs[start:end])
+        if len(self._ranges) >= self.max_cached_ranges:
+            self._ranges.clear()
+        self._ranges[key] = bitmap
+        return bitmap
+
+    def comparison_bitmap(self, field, lookup, value):
+        """
+        Bitmap of products whose `field` satisfies `lookup` (lt, lte, gt, gte, exact).
+        """
+        if lookup in ('gt', 'gte'):
+            return self.range_bitmap(field, value, None) & ~(
+                self.range_bitmap(field, value, value) if lookup == 'gt' else 0
+            )
+        if lookup in ('lt', 'lte'):
+            return self.range_bitmap(field, None, value, inclusive=lookup == 'lte')
+        return self.range_bitmap(field, value, value)
+
+    def facet_bitmap(self, facet, value):
+        if facet in ('price', 'rating'):
+            return self.range_bitmap(facet, *value)
+        if facet == 'organic':
+            return self.values['organic'].get(value, 0)
+        bitmap = 0
+        for item in value:
+            bitmap |= self.values[facet].get(item, 0)
+        return bitmap
+
+    def match(self, filters, constraints=(), exclude=None):
+        bitmap = self.all
+        for facet, value in filters.items():
+            if facet != exclude:
+                bitmap &= self.facet_bitmap(facet, value)
+        for field, lookup, value in constraints:
+            bitmap &= self.comparison_bitmap(field, lookup, value)
+        return bitmap
+
+    def counts(self, filters, constraints=()):
+        """
+        Return the number of matches and, per facet, the count of each value.
+
+        Each facet is counted against the other facets' filters only, so the
+        sidebar shows what selecting another value of that facet would return.
+        `constraints` are nutrition comparisons that apply to every facet.
+        """
+        facets = {}
+        for facet in FACETS:
+            base = self.match(filters, constraints, exclude=facet)
+            if facet in ('price', 'rating'):
+                values = self.buckets[facet].items()
+            elif facet == 'organic':
+                values = ((str(key).lower(), bitmap) for key, bitmap in self.values[facet].items())
+            else:
+                values = self.values[facet].items()
+            facets[facet] = {
+                label: count for label, bitmap in values
+                if (count := (base & bitmap).bit_count())
+            }
+        return self.match(filters, constraints).bit_count(), facets
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_marker = None
+_built_at = 0.0
+
+# A write committed after a later one was folded in is missed until the next rebuild.
+REBUILD_INTERVAL = 3600
+
+
+def get_facet_index():
+    """
+    Return this worker's facet index.
+
+    It is rebuilt when the catalog version moved and otherwise refreshed when the
+    facets marker moved. Changes are applied to a copy that then replaces the
+    published index, so readers never see a half-applied refresh.
+    """
+    global _index, _index_version, _marker, _built_at
+    version = get_version(CATALOG_VERSION)
+    marker = get_markers(FACETS_MARKER)[FACETS_MARKER]
+    expired = time.monotonic() - _built_at > REBUILD_INTERVAL
+    if _index is not None and (version, marker) == (_index_version, _marker) and not expired:
+        return _index
+    with _lock:
+        if _index is None or expired or version != _index_version:
+            _index = FacetIndex.build()
+            _built_at = time.monotonic()
+        elif marker != _marker:
+            index = _index.copy()
+            index.refresh()
+            _index = index
+        _index_version, _marker = version, marker
+    return _index
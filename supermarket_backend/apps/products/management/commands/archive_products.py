@@ -0,0 +1,78 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.cart.models import Cart
+from apps.cart.totals import refresh_cart_totals
+from apps.orders.models import OrderItem
+
+from ...models import ArchivedProduct, Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Moves products that have been inactive for a long time into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180, help='Archive products inactive for longer than this')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Order items cascade from their product, so ordered products stay put.
+        candidates = (
+            Product.objects.filter(is_active=False, updated_at__lt=cutoff)
+            .exclude(Exists(OrderItem.objects.filter(product_id=OuterRef('pk'))))
+            .order_by('id')
+        )
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} products would be archived')
+            return
+
+        started = time.monotonic()
+        archived = 0
+        last_id = 0
+        while True:
+            ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            archived += self.archive(ids)
+            last_id = ids[-1]
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} products in {elapsed:.1f}s'))
+
+    def archive(self, ids):
+        """
+        Copy one batch into the archive and delete it from the product table.
+        """
+        with transaction.atomic():
+            # re-check under lock in case a product was reactivated meanwhile
+            rows = list(Product.objects.select_for_update().filter(id__in=ids, is_active=False).values())
+            ids = [row['id'] for row in rows]
+            reviews = defaultdict(list)
+            for review in Review.objects.filter(product_id__in=ids).values(
+                'product_id', 'user_id', 'rating', 'comment', 'date', 'upvotes', 'downvotes'
+            ):
+                reviews[review.pop('product_id')].append(review)
+            ArchivedProduct.objects.bulk_create([
+                ArchivedProduct(
+                    product_id=row['id'],
+                    sku=row['sku'],
+                    name=row['name'],
+                    data={**row, 'reviews': reviews[row['id']]},
+                    deactivated_at=row['updated_at'],
+                )
+                for row in rows
+            ])
+            # cart lines cascade with the product, so the carts that held one are re-totalled
+            carts = list(Cart.objects.filter(items__product_id__in=ids).values_list('id', flat=True).distinct())
+            Product.objects.filter(id__in=ids).delete()
+            if carts:
+                refresh_cart_totals(Cart.objects.filter(id__in=carts))
+        return len(rows)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cache import bump_version
+
+from ...cache import invalidate_products_changed_since
+from ...facets import CATALOG_VERSION
+from ...models import Product
+from ...nutrition import backfill_nutrition
+
+
+class Command(BaseCommand):
+    help = 'Parses the nutrition JSON of every product into the typed nutrient columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        since = timezone.now()
+        updated = backfill_nutrition(Product, batch_size=options['batch_size'])
+        bump_version(CATALOG_VERSION)
+        invalidate_products_changed_since(since)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Parsed nutrition for {updated} products in {elapsed:.1f}s'))
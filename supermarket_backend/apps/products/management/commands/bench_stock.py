@@ -0,0 +1,76 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...models import Product
+from ...stock import OutOfStock, get_stock, reserve_stock, set_stock
+
+
+class Command(BaseCommand):
+    help = 'Measures stock reservations per second when many threads reserve the same product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=20, help='Reservations tried by each thread')
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--shards', type=int, default=4)
+
+    def handle(self, *args, **options):
+        threads, attempts = options['threads'], options['attempts']
+        if threads < 1 or attempts < 1 or options['stock'] < 0 or not 1 <= options['shards'] <= 64:
+            raise CommandError('threads and attempts must be >= 1, stock >= 0 and shards between 1 and 64')
+        # a scratch product keeps the benchmark away from real stock; it is deleted afterwards
+        product = Product.objects.create(
+            name='Stock benchmark', price='0.00', description='', image='', is_active=False
+        )
+        try:
+            set_stock(product.id, options['stock'], shards=options['shards'])
+            reserved, elapsed = self.contend(product.id, threads, attempts)
+            left = get_stock([product.id])[product.id]
+        finally:
+            Product.objects.filter(pk=product.pk).delete()
+
+        expected = min(options['stock'], threads * attempts)
+        if reserved != expected or left != options['stock'] - reserved:
+            raise CommandError(f'{reserved} reserved and {left} left of {options["stock"]}: stock was oversold')
+        self.stdout.write(self.style.SUCCESS(
+            f'{threads * attempts / elapsed:.0f} reservations/sec '
+            f'({threads} threads, {options["shards"]} shards, {reserved} reserved)'
+        ))
+
+    def contend(self, product_id, threads, attempts):
+        """
+        Reserve one unit `attempts` times from each of `threads` threads started together.
+
+        Returns the number of successful reservations and the elapsed seconds.
+        """
+        reserved = []
+        errors = []
+        start = threading.Barrier(threads)
+
+        def worker():
+            try:
+                start.wait()
+                for _ in range(attempts):
+                    try:
+                        reserve_stock({product_id: 1})
+                        reserved.append(1)
+                    except OutOfStock:
+                        pass
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise CommandError(f'{len(errors)} threads failed: {errors[0]!r}')
+        return len(reserved), elapsed
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...recommendations import fold_new_orders
+
+
+class Command(BaseCommand):
+    help = 'Adds orders placed since the last run to the "frequently bought together" index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--loop', type=float, metavar='SECONDS',
+            help='Keep folding, sleeping this long whenever no new orders are waiting',
+        )
+
+    def handle(self, *args, **options):
+        folded = 0
+        while True:
+            batch = fold_new_orders(batch_size=options['batch_size'])
+            folded += batch
+            if batch:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} orders into the co-purchase index'))
@@ -0,0 +1,188 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.cart.models import Cart
+from apps.cart.totals import refresh_cart_totals
+from apps.categories.models import Category
+from core.cache import bump_version
+
+from ...cache import invalidate_product, touch_catalog_markers
+from ...facets import CATALOG_VERSION
+from ...models import Product
+from ...nutrition import NUTRIENTS, parse_nutrition
+from ...search import get_search_backend
+
+TEXT_FIELDS = ['name', 'description', 'image', 'weight', 'origin', 'storage']
+UPDATE_FIELDS = [
+    'name', 'price', 'description', 'image', 'category', 'weight', 'origin', 'organic',
+    'storage', 'nutrition', 'is_active', 'updated_at', *NUTRIENTS,
+]
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Imports or updates products from a CSV or NDJSON supplier file, keyed by SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--strict', action='store_true', help='Abort on the first invalid row')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'ndjson')
+        batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.search = get_search_backend()
+        self.touched_categories = set()
+
+        started = time.monotonic()
+        imported = skipped = 0
+        with path.open(newline='', encoding='utf-8') as handle:
+            batch = []
+            for line_number, raw in self.read_rows(handle, file_format):
+                try:
+                    batch.append(self.build_product(raw))
+                except RowError as error:
+                    if options['strict']:
+                        raise CommandError(f'Line {line_number}: {error}')
+                    skipped += 1
+                    self.stderr.write(f'Line {line_number}: {error}')
+                    continue
+                if len(batch) >= batch_size:
+                    imported += self.upsert(batch)
+                    batch = []
+                    self.report(imported, started, ending='\r')
+            imported += self.upsert(batch)
+
+        bump_version(CATALOG_VERSION)
+        touch_catalog_markers(category_ids=self.touched_categories)
+
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else imported
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products ({skipped} skipped) in {elapsed:.1f}s, {rate:.0f} rows/sec'
+        ))
+
+    def report(self, imported, started, ending='\n'):
+        if self.verbosity > 1:
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{imported} rows, {imported / elapsed:.0f} rows/sec', ending=ending)
+
+    def read_rows(self, handle, file_format):
+        """
+        Yield `(line_number, row_dict)` without loading the file into memory.
+        """
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                row = {'__error__': f'invalid JSON ({error})'}
+            yield line_number, row
+
+    def build_product(self, row):
+        if '__error__' in row:
+            raise RowError(row['__error__'])
+        sku = str(row.get('sku') or '').strip()
+        name = str(row.get('name') or '').strip()
+        if not sku:
+            raise RowError('sku is required')
+        if not name:
+            raise RowError('name is required')
+        try:
+            price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        except (InvalidOperation, TypeError):
+            raise RowError(f'invalid price {row.get("price")!r}')
+        if price < 0:
+            raise RowError('price must not be negative')
+
+        category_id = None
+        slug = str(row.get('category') or '').strip()
+        if slug:
+            category_id = self.categories.get(slug)
+            if category_id is None:
+                raise RowError(f'unknown category {slug!r}')
+            self.touched_categories.add(category_id)
+
+        nutrition = row.get('nutrition') or {}
+        if isinstance(nutrition, str):
+            try:
+                nutrition = json.loads(nutrition)
+            except ValueError:
+                raise RowError('nutrition must be a JSON object')
+        if not isinstance(nutrition, dict):
+            raise RowError('nutrition must be a JSON object')
+        for field in NUTRIENTS:
+            if row.get(field) not in (None, ''):
+                nutrition[field] = row[field]
+
+        values = {field: (str(row[field]).strip() or None) if row.get(field) is not None else None for field in TEXT_FIELDS}
+        values['description'] = values['description'] or ''
+        values['image'] = values['image'] or ''
+        return Product(
+            sku=sku,
+            price=price,
+            category_id=category_id,
+            organic=str(row.get('organic', '')).strip().lower() in TRUE_VALUES,
+            is_active=str(row.get('is_active', 'true')).strip().lower() in TRUE_VALUES,
+            nutrition=nutrition,
+            **values,
+            **parse_nutrition(nutrition),
+        )
+
+    def upsert(self, products):
+        """
+        Insert or update one batch in a single transaction and re-index it.
+        """
+        if not products:
+            return 0
+        # keep the last occurrence of a SKU repeated within the batch
+        products = list({product.sku: product for product in products}.values())
+        skus = [product.sku for product in products]
+        with transaction.atomic():
+            existing = {}
+            rows = Product.objects.filter(sku__in=skus).values_list('sku', 'id', 'price', 'category_id')
+            for sku, product_id, price, category_id in rows:
+                existing[sku] = (product_id, price)
+                # a SKU moving category also changes the listing it leaves
+                self.touched_categories.add(category_id)
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=UPDATE_FIELDS,
+            )
+            saved = list(Product.objects.filter(sku__in=skus).select_related('category'))
+            self.search.index_products(saved)
+            # bulk upserts send no signals, so carts holding a repriced product are re-totalled here
+            repriced = [
+                existing[product.sku][0] for product in products
+                if product.sku in existing and existing[product.sku][1] != product.price
+            ]
+            if repriced:
+                refresh_cart_totals(Cart.objects.filter(items__product_id__in=repriced))
+        invalidate_product(*(product_id for product_id, _ in existing.values()))
+        return len(products)
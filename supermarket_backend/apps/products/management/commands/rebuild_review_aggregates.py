@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cache import bump_version
+
+from ...aggregates import rebuild_review_aggregates
+from ...cache import invalidate_products_changed_since
+from ...facets import CATALOG_VERSION
+
+
+class Command(BaseCommand):
+    help = 'Recomputes review counts, rating sums and star histograms for every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        since = timezone.now()
+        reviewed = rebuild_review_aggregates(batch_size=options['batch_size'])
+        bump_version(CATALOG_VERSION)
+        invalidate_products_changed_since(since)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt review aggregates for {reviewed} reviewed products in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from the active catalog'
+
+    def handle(self, *args, **kwargs):
+        started = time.monotonic()
+        get_search_backend().rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt product search index in {elapsed:.1f}s'))
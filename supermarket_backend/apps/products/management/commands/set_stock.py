@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Product
+from ...stock import set_stock
+
+
+class Command(BaseCommand):
+    help = 'Sets a product\'s stock, optionally split over several counter rows for hot products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('quantity', type=int)
+        parser.add_argument('--shards', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['quantity'] < 0 or not 1 <= options['shards'] <= 64:
+            raise CommandError('quantity must be >= 0 and shards between 1 and 64')
+        if not Product.objects.filter(id=options['product_id']).exists():
+            raise CommandError(f"Product {options['product_id']} does not exist")
+        set_stock(options['product_id'], options['quantity'], shards=options['shards'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Product {options['product_id']}: {options['quantity']} in stock over {options['shards']} shard(s)"
+        ))
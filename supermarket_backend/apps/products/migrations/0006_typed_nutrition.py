@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+from apps.products.nutrition import backfill_nutrition
+
+
+def parse_existing_nutrition(apps, schema_editor):
+    backfill_nutrition(apps.get_model('products', 'Product'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_co_purchase_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='calories',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='carbs',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='fat',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='fiber',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='protein',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(parse_existing_nutrition, migrations.RunPython.noop),
+    ]
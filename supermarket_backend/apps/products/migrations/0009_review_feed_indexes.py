@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def compute_helpfulness(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    Review.objects.update(helpfulness=F('upvotes') - F('downvotes'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_sku'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='helpfulness',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(compute_helpfulness, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='review_feed_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'rating', 'id'], name='review_feed_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'helpfulness', 'id'], name='review_feed_helpful_idx'),
+        ),
+    ]
@@ -1,14 +1,33 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
 from django.core.validators import MinValueValidator, MaxValueValidator
 from apps.categories.models import Category
 from django.contrib.auth import get_user_model
+from .nutrition import NUTRIENTS, parse_nutrition
 
 User = get_user_model()
 
+
+class ActiveProductManager(models.Manager):
+    """
+    Products that have not been soft-deleted; use it on every public read path.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
+
 class Product(models.Model):
     """
     Represents a product in the system.
     """
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True
+    )
     category = models.ForeignKey(
         Category,
         related_name='products',
@@ -56,21 +75,104 @@ class Product(models.Model):
         blank=True,
         null=True
     )
+    # Typed copies of `nutrition`, parsed on save so they can be indexed and
+    # range-filtered. Calories are kcal per 100g, the rest grams.
+    calories = models.FloatField(blank=True, null=True, db_index=True)
+    protein = models.FloatField(blank=True, null=True, db_index=True)
+    carbs = models.FloatField(blank=True, null=True, db_index=True)
+    fat = models.FloatField(blank=True, null=True, db_index=True)
+    fiber = models.FloatField(blank=True, null=True, db_index=True)
     is_active = models.BooleanField(
         default=True  
     )
+    review_count = models.PositiveIntegerField(
+        default=0
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0
+    )
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True
+    )
+
+    objects = models.Manager()
+    active = ActiveProductManager()
+
+    class Meta:
+        # Partial indexes on the catalog sort keys: soft-deleted rows do not
+        # take up index space or get scanned by listing queries.
+        indexes = [
+            models.Index(fields=['price', 'id'], condition=Q(is_active=True), name='product_active_price_idx'),
+            models.Index(fields=['rating', 'id'], condition=Q(is_active=True), name='product_active_rating_idx'),
+            models.Index(fields=['name', 'id'], condition=Q(is_active=True), name='product_active_name_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        for field, value in parse_nutrition(self.nutrition).items():
+            setattr(self, field, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nutrition' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *NUTRIENTS}
+        super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
         """
         Soft delete the product by setting `is_active` to False.
+
+        Only the flag is written, so a stale instance cannot overwrite counters
+        such as the review aggregates.
         """
         self.is_active = False
-        self.save()
+        self.save(update_fields=['is_active', 'updated_at'])
+
+    @property
+    def rating_histogram(self):
+        """
+        Number of reviews per star rating, read from the denormalized counters.
+        """
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(1, 6)}
 
     def __str__(self):
         return self.name
 
 
+class ArchivedProduct(models.Model):
+    """
+    A long-inactive product moved out of the hot table by `archive_products`.
+
+    `data` holds every column of the product row plus its reviews, so an
+    archived product can be inspected or restored by hand.
+    """
+    product_id = models.PositiveIntegerField(
+        unique=True
+    )
+    sku = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        db_index=True
+    )
+    name = models.CharField(
+        max_length=255
+    )
+    data = models.JSONField(
+        encoder=DjangoJSONEncoder
+    )
+    deactivated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    def __str__(self):
+        return f"{self.name} (archived)"
+
+
 class Review(models.Model):
     """
     Represents a review for a product.
@@ -97,13 +199,220 @@ class Review(models.Model):
     downvotes = models.PositiveIntegerField(
         default=0  
     )
+    # Stored `upvotes - downvotes` so the review feed can sort on an index.
+    helpfulness = models.IntegerField(
+        default=0
+    )
 
-    @property
-    def helpfulness(self):
-        """
-        Calculate the helpfulness score of the review.
-        """
-        return self.upvotes - self.downvotes
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'date', 'id'], name='review_feed_date_idx'),
+            models.Index(fields=['product', 'rating', 'id'], name='review_feed_rating_idx'),
+            models.Index(fields=['product', 'helpfulness', 'id'], name='review_feed_helpful_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.helpfulness = self.upvotes - self.downvotes
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'upvotes', 'downvotes'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'helpfulness'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Review by {self.user.email} for {self.product.name}"
+
+
+class ReviewVote(models.Model):
+    """
+    One user's vote on a review. A second vote is rejected by the unique constraint.
+    """
+    UP = 1
+    DOWN = -1
+    VALUE_CHOICES = [
+        (UP, 'Up'),
+        (DOWN, 'Down'),
+    ]
+
+    review = models.ForeignKey(
+        Review,
+        related_name='votes',
+        on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        User,
+        related_name='review_votes',
+        on_delete=models.CASCADE
+    )
+    value = models.SmallIntegerField(
+        choices=VALUE_CHOICES
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['review', 'user'],
+                name='unique_review_vote'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_value_display()} vote on review {self.review_id}"
+
+class SearchTerm(models.Model):
+    """
+    A token in the product search vocabulary.
+    """
+    term = models.CharField(
+        max_length=64,
+        unique=True
+    )
+    document_count = models.PositiveIntegerField(
+        default=0
+    )
+
+    def __str__(self):
+        return self.term
+
+
+class SearchPosting(models.Model):
+    """
+    One entry of the inverted index: how often a term occurs in one field of a product.
+    """
+    FIELD_CHOICES = [
+        ('name', 'Name'),
+        ('category', 'Category'),
+        ('origin', 'Origin'),
+        ('description', 'Description'),
+    ]
+
+    term = models.ForeignKey(
+        SearchTerm,
+        related_name='postings',
+        on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='search_postings',
+        on_delete=models.CASCADE
+    )
+    field = models.CharField(
+        max_length=16,
+        choices=FIELD_CHOICES
+    )
+    frequency = models.PositiveIntegerField()
+    field_length = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'product', 'field'],
+                name='unique_search_posting'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.term} in {self.field} of product {self.product_id}"
+
+
+class SearchFieldStats(models.Model):
+    """
+    Running totals per indexed field, used for BM25 length normalisation.
+    """
+    field = models.CharField(
+        max_length=16,
+        unique=True
+    )
+    document_count = models.PositiveIntegerField(
+        default=0
+    )
+    total_length = models.PositiveBigIntegerField(
+        default=0
+    )
+
+    def __str__(self):
+        return self.field
+
+
+class CoPurchase(models.Model):
+    """
+    "Frequently bought together" edge: `related` appeared in `score` orders with `product`.
+
+    Only the top-K neighbours of each product are kept.
+    """
+    product = models.ForeignKey(
+        Product,
+        related_name='co_purchases',
+        on_delete=models.CASCADE
+    )
+    related = models.ForeignKey(
+        Product,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    score = models.PositiveIntegerField(
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'related'],
+                name='unique_co_purchase'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-score'], name='co_purchase_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.related_id} bought with {self.product_id} ({self.score})"
+
+
+class CoPurchaseWatermark(models.Model):
+    """
+    Single row recording the last order folded into the co-purchase index.
+    """
+    last_order_id = models.BigIntegerField(
+        default=0
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f"Co-purchases folded up to order {self.last_order_id}"
+
+
+class StockShard(models.Model):
+    """
+    One slice of a product's stock; the product's stock is the sum of its shards.
+
+    Most products have a single shard. Splitting a hot product over several rows
+    lets concurrent checkouts decrement different rows instead of queueing on one
+    row lock. Products without shards are not stock-tracked.
+    """
+    product = models.ForeignKey(
+        Product,
+        related_name='stock_shards',
+        on_delete=models.CASCADE
+    )
+    shard = models.PositiveSmallIntegerField(
+        default=0
+    )
+    quantity = models.PositiveIntegerField(
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'shard'],
+                name='unique_stock_shard'
+            ),
+        ]
 
     def __str__(self):
-        return f"Review by {self.user.username} for {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} of {self.product_id} (shard {self.shard})"
@@ -0,0 +1,91 @@
+import re
+
+from django.utils import timezone
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+AMOUNT_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+# `calories<200`, `protein>=10` (sent as `protein>=10` in the query string) and
+# Django-style `fat__lte=5` are all accepted.
+COMPARISON_RE = re.compile(
+    r'^(?P<field>' + '|'.join(NUTRIENTS) + r')'
+    r'(?:(?P<op><=|>=|<|>|=)|__(?P<lookup>lt|lte|gt|gte|exact)=)'
+    r'(?P<value>\d+(?:\.\d+)?)$'
+)
+OPERATORS = {'<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte', '=': 'exact'}
+
+
+def parse_amount(value):
+    """
+    Pull the leading number out of a nutrition value such as "120 kcal per 100g".
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = AMOUNT_RE.search(str(value))
+    if not match:
+        return None
+    return float(match.group().replace(',', '.'))
+
+
+def parse_nutrition(nutrition):
+    """
+    Map the free-form nutrition JSON onto the typed nutrient columns.
+    """
+    nutrition = nutrition if isinstance(nutrition, dict) else {}
+    return {field: parse_amount(nutrition.get(field)) for field in NUTRIENTS}
+
+
+def parse_nutrition_filters(params):
+    """
+    Return `(field, lookup, value)` triples for every nutrient comparison in `params`.
+    """
+    filters = []
+    for key, values in params.lists():
+        for value in values:
+            expression = f'{key}={value}' if value else key
+            match = COMPARISON_RE.match(expression.replace(' ', ''))
+            if match:
+                lookup = match.group('lookup') or OPERATORS[match.group('op')]
+                filters.append((match.group('field'), lookup, float(match.group('value'))))
+    return filters
+
+
+def apply_nutrition_filters(queryset, filters):
+    for field, lookup, value in filters:
+        queryset = queryset.filter(**{f'{field}__{lookup}': value})
+    return queryset
+
+
+def backfill_nutrition(product_model, batch_size=1000):
+    """
+    Re-parse `nutrition` into the typed columns for every product.
+
+    Takes the model class so the data migration can pass its historical model.
+    Only rows whose typed columns change are written; they also get a new
+    `updated_at` where the model has one. Returns the number of products updated.
+    """
+    fields = list(NUTRIENTS)
+    stamp = any(field.name == 'updated_at' for field in product_model._meta.get_fields())
+    if stamp:
+        fields.append('updated_at')
+    now = timezone.now()
+    updated = 0
+    batch = []
+    rows = product_model.objects.order_by('pk').values_list('pk', 'nutrition', *NUTRIENTS)
+    for pk, nutrition, *stored in rows.iterator(chunk_size=batch_size):
+        parsed = parse_nutrition(nutrition)
+        if [parsed[field] for field in NUTRIENTS] == stored:
+            continue
+        product = product_model(pk=pk, **parsed)
+        if stamp:
+            product.updated_at = now
+        batch.append(product)
+        if len(batch) >= batch_size:
+            product_model.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    product_model.objects.bulk_update(batch, fields)
+    return updated + len(batch)
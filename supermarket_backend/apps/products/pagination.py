@@ -0,0 +1,34 @@
+from rest_framework.pagination import PageNumberPagination
+
+from core.pagination import KeysetPagination
+
+
+class ProductCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for the public catalog, sortable on the indexed columns.
+    """
+    ordering_fields = ('id', 'price', 'rating', 'name')
+    default_ordering = 'id'
+
+
+class ReviewFeedPagination(KeysetPagination):
+    """
+    Cursor pagination for a product's reviews, backed by the `(product, key, id)` indexes.
+    """
+    ordering_fields = ('date', 'rating', 'helpfulness')
+    ordering_aliases = {
+        'newest': '-date',
+        'oldest': 'date',
+        'highest': '-rating',
+        'lowest': 'rating',
+        'helpful': '-helpfulness',
+    }
+    default_ordering = '-date'
+
+
+class ProductSearchPagination(PageNumberPagination):
+    """
+    Page-number pagination over a ranked list of search hits.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,186 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import groupby, permutations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CoPurchase, CoPurchaseWatermark, Product
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - scipy is optional
+    np = sparse = None
+
+# Neighbours kept per product by a rebuild. Reads take the top few by score, so
+# the pool only needs to be deep enough for new pairs to climb into the top.
+CANDIDATES = getattr(settings, 'RELATED_PRODUCTS_CANDIDATES', 200)
+# Orders younger than this may still be committing out of id order.
+SETTLE_SECONDS = 60
+
+
+def iter_baskets(chunk_size=2000, after=0, until=None):
+    """
+    Yield the distinct product ids of each order with `after < id <= until`, one list per order.
+    """
+    from apps.orders.models import OrderItem
+
+    items = OrderItem.objects.filter(order_id__gt=after)
+    if until is not None:
+        items = items.filter(order_id__lte=until)
+    rows = (
+        items.order_by('order_id', 'product_id')
+        .values_list('order_id', 'product_id')
+        .distinct()
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, items in groupby(rows, key=lambda row: row[0]):
+        yield [product_id for _, product_id in items]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def count_co_purchases(baskets, top_k=CANDIDATES, chunk_size=10000):
+    """
+    Count how many baskets each ordered pair of products shares.
+
+    With scipy available the baskets are loaded chunk by chunk into a sparse
+    order-by-product incidence matrix X and the pair counts are X.T @ X; without
+    it the pairs are counted in pure Python. Returns the top-K neighbours of every
+    product as `{product_id: [(related_id, score), ...]}`, best first.
+    """
+    if sparse is None:
+        counts = Counter()
+        for basket in baskets:
+            counts.update(permutations(set(basket), 2))
+        neighbours = defaultdict(list)
+        for (product_id, related_id), score in counts.items():
+            neighbours[product_id].append((related_id, score))
+        return {
+            product_id: sorted(pairs, key=lambda pair: (-pair[1], pair[0]))[:top_k]
+            for product_id, pairs in neighbours.items()
+        }
+
+    width = (Product.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    matrix = sparse.csr_matrix((width, width), dtype=np.int64)
+    for chunk in _chunks(baskets, chunk_size):
+        rows = np.repeat(np.arange(len(chunk)), [len(basket) for basket in chunk])
+        columns = np.fromiter((pid for basket in chunk for pid in basket), dtype=np.int64, count=len(rows))
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, columns)), shape=(len(chunk), width)
+        )
+        incidence.data[:] = 1  # duplicates are summed on construction; keep it binary
+        matrix = matrix + (incidence.T @ incidence).tocsr()
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+
+    neighbours = {}
+    for product_id in np.flatnonzero(np.diff(matrix.indptr)):
+        start, end = matrix.indptr[product_id], matrix.indptr[product_id + 1]
+        related, scores = matrix.indices[start:end], matrix.data[start:end]
+        order = np.lexsort((related, -scores))[:top_k]
+        neighbours[int(product_id)] = [(int(related[i]), int(scores[i])) for i in order]
+    return neighbours
+
+
+def rebuild_co_purchase_index(top_k=CANDIDATES, batch_size=1000):
+    """
+    Replace the co-purchase index with counts recomputed from every order.
+
+    Keeps the best `top_k` candidates per product and moves the fold watermark
+    past the orders counted, so `fold_new_orders` continues from there.
+    """
+    from apps.orders.models import Order
+
+    with transaction.atomic():
+        watermark = _lock_watermark()
+        until = Order.objects.aggregate(last=Max('id'))['last'] or 0
+        neighbours = count_co_purchases(iter_baskets(until=until), top_k=top_k)
+        rows = (
+            CoPurchase(product_id=product_id, related_id=related_id, score=score)
+            for product_id, pairs in neighbours.items()
+            for related_id, score in pairs
+        )
+        CoPurchase.objects.all().delete()
+        created = 0
+        for chunk in _chunks(rows, batch_size):
+            CoPurchase.objects.bulk_create(chunk)
+            created += len(chunk)
+        watermark.last_order_id = until
+        watermark.save()
+    return created
+
+
+def _lock_watermark():
+    CoPurchaseWatermark.objects.get_or_create(pk=1)
+    return CoPurchaseWatermark.objects.select_for_update().get(pk=1)
+
+
+def add_co_purchase_counts(counts, batch_size=1000):
+    """
+    Add `{(product_id, related_id): count}` to the stored scores.
+
+    Scores are only ever added to, never trimmed, so a pair first seen after a
+    rebuild keeps accumulating until it ranks among its product's top neighbours.
+    """
+    by_product = defaultdict(set)
+    for product_id, related_id in counts:
+        by_product[product_id].add(related_id)
+    for product_ids in _chunks(sorted(by_product), batch_size):
+        related_ids = set().union(*(by_product[product_id] for product_id in product_ids))
+        existing = {
+            (product_id, related_id): (row_id, score)
+            for row_id, product_id, related_id, score in CoPurchase.objects.filter(
+                product_id__in=product_ids, related_id__in=related_ids
+            ).values_list('id', 'product_id', 'related_id', 'score')
+        }
+        updated, created = [], []
+        for product_id in product_ids:
+            for related_id in by_product[product_id]:
+                count = counts[product_id, related_id]
+                if (product_id, related_id) in existing:
+                    row_id, score = existing[product_id, related_id]
+                    updated.append(CoPurchase(id=row_id, score=score + count))
+                else:
+                    created.append(CoPurchase(product_id=product_id, related_id=related_id, score=count))
+        CoPurchase.objects.bulk_update(updated, ['score'], batch_size=batch_size)
+        CoPurchase.objects.bulk_create(created, batch_size=batch_size)
+
+
+def fold_new_orders(batch_size=500):
+    """
+    Fold up to `batch_size` orders placed since the last fold into the index.
+
+    Runs off the request path (see the `fold_co_purchases` command); concurrent
+    runs serialise on the watermark row. Returns the number of orders folded.
+    """
+    from apps.orders.models import Order
+
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    with transaction.atomic():
+        watermark = _lock_watermark()
+        order_ids = list(
+            Order.objects.filter(id__gt=watermark.last_order_id, created_at__lt=settled)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+        counts = Counter()
+        for basket in iter_baskets(after=watermark.last_order_id, until=order_ids[-1]):
+            counts.update(permutations(basket, 2))
+        add_co_purchase_counts(counts)
+        watermark.last_order_id = order_ids[-1]
+        watermark.save()
+    return len(order_ids)
@@ -0,0 +1,333 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Length
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+MAX_RESULTS = getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', 1000)
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'the', 'to', 'with',
+})
+
+
+def normalize(token):
+    """
+    Fold simple English plurals so "berries" and "berry" share a term.
+    """
+    if len(token) > 4 and token.endswith('ies'):
+        token = token[:-3] + 'y'
+    elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    return token[:MAX_TERM_LENGTH]
+
+
+def tokenize(text):
+    """
+    Split text into lower-cased, normalised index terms.
+    """
+    if not text:
+        return []
+    return [
+        normalize(token)
+        for token in TOKEN_RE.findall(text.lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between `a` and `b`, giving up once it exceeds `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class SearchBackend:
+    """
+    Interface every product search backend implements.
+    """
+
+    def index_products(self, products):
+        raise NotImplementedError
+
+    def remove_products(self, product_ids):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Return the ids of the `limit` best matching active products, best match first.
+        """
+        raise NotImplementedError
+
+
+class InvertedIndexBackend(SearchBackend):
+    """
+    Database-backed inverted index ranked with BM25F.
+
+    Each product field is tokenised into `SearchPosting` rows keyed by term, so a
+    query only reads the posting lists of the terms it mentions instead of scanning
+    the product table. Prefix expansion and single-edit typo correction are resolved
+    against the vocabulary before postings are fetched.
+    """
+    field_weights = {
+        'name': 5.0,
+        'category': 2.0,
+        'origin': 1.5,
+        'description': 1.0,
+    }
+    k1 = 1.2
+    b = 0.75
+    prefix_factor = 0.7
+    fuzzy_factor = 0.5
+    max_expansions = 20
+    max_fuzzy_candidates = 500
+    batch_size = 500
+
+    def __init__(self, apps=global_apps):
+        # the data migration indexes with its historical models
+        self.product_model = apps.get_model('products', 'Product')
+        self.term_model = apps.get_model('products', 'SearchTerm')
+        self.posting_model = apps.get_model('products', 'SearchPosting')
+        self.stats_model = apps.get_model('products', 'SearchFieldStats')
+
+    def document_fields(self, product):
+        category = product.category
+        return {
+            'name': tokenize(product.name),
+            'category': tokenize(category.name) if category else [],
+            'origin': tokenize(product.origin),
+            'description': tokenize(product.description),
+        }
+
+    # Indexing
+
+    def index_products(self, products):
+        products = [product for product in products if product.pk]
+        if not products:
+            return
+        with transaction.atomic():
+            self._remove([product.pk for product in products])
+            active = [product for product in products if product.is_active]
+            for start in range(0, len(active), self.batch_size):
+                self._add(active[start:start + self.batch_size])
+
+    def remove_products(self, product_ids):
+        with transaction.atomic():
+            self._remove(list(product_ids))
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.posting_model.objects.all().delete()
+            self.term_model.objects.all().delete()
+            self.stats_model.objects.all().delete()
+            queryset = self.product_model.objects.filter(is_active=True).select_related('category')
+            batch = []
+            for product in queryset.iterator(chunk_size=self.batch_size):
+                batch.append(product)
+                if len(batch) >= self.batch_size:
+                    self._add(batch)
+                    batch = []
+            self._add(batch)
+
+    def _add(self, products):
+        if not products:
+            return
+        documents = {product.pk: self.document_fields(product) for product in products}
+
+        vocabulary = {token for fields in documents.values() for tokens in fields.values() for token in tokens}
+        self.term_model.objects.bulk_create(
+            [self.term_model(term=term) for term in vocabulary], ignore_conflicts=True
+        )
+        term_ids = dict(self.term_model.objects.filter(term__in=vocabulary).values_list('term', 'id'))
+
+        postings = []
+        document_terms = Counter()
+        field_lengths = Counter()
+        for product_id, fields in documents.items():
+            seen = set()
+            for field, tokens in fields.items():
+                field_lengths[field] += len(tokens)
+                for term, frequency in Counter(tokens).items():
+                    postings.append((term_ids[term], product_id, field, frequency, len(tokens)))
+                    seen.add(term)
+            document_terms.update(seen)
+
+        self._insert_postings(postings)
+        self._adjust_terms({term_ids[term]: count for term, count in document_terms.items()})
+        self._adjust_stats(len(documents), field_lengths)
+
+    def _insert_postings(self, rows):
+        """
+        Insert posting tuples with executemany; building model instances for
+        millions of postings would dominate bulk indexing time.
+        """
+        meta = self.posting_model._meta
+        columns = ', '.join(
+            connection.ops.quote_name(meta.get_field(name).column)
+            for name in ('term', 'product', 'field', 'frequency', 'field_length')
+        )
+        sql = (
+            f'INSERT INTO {connection.ops.quote_name(meta.db_table)} ({columns}) '
+            f'VALUES (%s, %s, %s, %s, %s)'
+        )
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size * 10):
+                cursor.executemany(sql, rows[start:start + self.batch_size * 10])
+
+    def _remove(self, product_ids):
+        if not product_ids:
+            return
+        postings = self.posting_model.objects.filter(product_id__in=product_ids)
+        rows = list(postings.values_list('term_id', 'product_id', 'field', 'field_length'))
+        if not rows:
+            return
+
+        document_terms = Counter(term_id for term_id, _ in {(row[0], row[1]) for row in rows})
+        field_lengths = Counter()
+        for (_, field), length in {(row[1], row[2]): row[3] for row in rows}.items():
+            field_lengths[field] += length
+
+        postings.delete()
+        self._adjust_terms({term_id: -count for term_id, count in document_terms.items()})
+        indexed = len({product_id for _, product_id, *_ in rows})
+        self._adjust_stats(-indexed, Counter({field: -length for field, length in field_lengths.items()}))
+        self.term_model.objects.filter(id__in=document_terms.keys(), document_count=0).delete()
+
+    def _adjust_terms(self, deltas):
+        by_delta = defaultdict(list)
+        for term_id, delta in deltas.items():
+            by_delta[delta].append(term_id)
+        for delta, ids in by_delta.items():
+            self.term_model.objects.filter(id__in=ids).update(document_count=F('document_count') + delta)
+
+    def _adjust_stats(self, documents, field_lengths):
+        self.stats_model.objects.bulk_create(
+            [self.stats_model(field=field) for field in self.field_weights], ignore_conflicts=True
+        )
+        for field in self.field_weights:
+            self.stats_model.objects.filter(field=field).update(
+                document_count=F('document_count') + documents,
+                total_length=F('total_length') + field_lengths.get(field, 0),
+            )
+
+    # Querying
+
+    def expand(self, tokens):
+        """
+        Map each query token to the vocabulary terms it matches, with a weight factor.
+
+        A token matches itself and its `max_expansions` most frequent extensions.
+        Only a token with no such match is corrected, against at most
+        `max_fuzzy_candidates` terms sharing its first letter whose length is within
+        the edit limit.
+        """
+        terms = self.term_model.objects.filter(document_count__gt=0)
+        expansions = []
+        for token in tokens:
+            matches = {}
+            # the token itself sorts first, then its most frequent extensions
+            prefixed = list(
+                terms.filter(term__startswith=token)
+                .order_by(Case(When(term=token, then=0), default=1), '-document_count', 'term')
+                .values_list('id', 'term', 'document_count')[:self.max_expansions + 1]
+            )
+            if prefixed and prefixed[0][1] == token:
+                term_id, _, document_count = prefixed.pop(0)
+                matches[term_id] = (1.0, document_count)
+            for term_id, _, document_count in prefixed[:self.max_expansions]:
+                matches[term_id] = (self.prefix_factor, document_count)
+            if not matches and len(token) >= 4:
+                limit = 1 if len(token) < 8 else 2
+                candidates = (
+                    terms.annotate(length=Length('term'))
+                    .filter(term__startswith=token[0], length__range=(len(token) - limit, len(token) + limit))
+                    .order_by('-document_count', 'term')
+                    .values_list('id', 'term', 'document_count')[:self.max_fuzzy_candidates]
+                )
+                for term_id, term, document_count in candidates:
+                    if edit_distance(token, term, limit) <= limit:
+                        matches[term_id] = (self.fuzzy_factor, document_count)
+                        if len(matches) >= self.max_expansions:
+                            break
+            expansions.append(matches)
+        return expansions
+
+    def search(self, query, limit=MAX_RESULTS):
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+        expansions = self.expand(tokens)
+        term_ids = {term_id for matches in expansions for term_id in matches}
+        if not term_ids:
+            return []
+
+        stats = {
+            row.field: row for row in self.stats_model.objects.all()
+        }
+        total_documents = max((row.document_count for row in stats.values()), default=0) or 1
+        average_length = {
+            field: (row.total_length / row.document_count) if row.document_count else 1.0
+            for field, row in stats.items()
+        }
+
+        # weighted term frequency per (product, term), combined across fields (BM25F)
+        weighted = defaultdict(lambda: defaultdict(float))
+        postings = self.posting_model.objects.filter(term_id__in=term_ids).values_list(
+            'term_id', 'product_id', 'field', 'frequency', 'field_length'
+        )
+        for term_id, product_id, field, frequency, field_length in postings.iterator(chunk_size=2000):
+            norm = 1 - self.b + self.b * field_length / (average_length.get(field) or 1.0)
+            weighted[term_id][product_id] += self.field_weights[field] * frequency / norm
+
+        scores = defaultdict(float)
+        matched = Counter()
+        for matches in expansions:
+            best = {}
+            for term_id, (factor, document_count) in matches.items():
+                idf = math.log(1 + (total_documents - document_count + 0.5) / (document_count + 0.5))
+                for product_id, tf in weighted[term_id].items():
+                    score = factor * idf * tf * (self.k1 + 1) / (tf + self.k1)
+                    if score > best.get(product_id, 0.0):
+                        best[product_id] = score
+            for product_id, score in best.items():
+                scores[product_id] += score
+                matched[product_id] += 1
+
+        # only the best `limit` hits are ever paged through, so skip a full sort
+        return heapq.nsmallest(
+            limit, scores, key=lambda product_id: (-matched[product_id], -scores[product_id], product_id)
+        )
+
+
+def get_search_backend():
+    backend_path = getattr(
+        settings, 'PRODUCT_SEARCH_BACKEND', 'apps.products.search.InvertedIndexBackend'
+    )
+    return import_string(backend_path)()
@@ -6,41 +6,74 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Review
-        fields = ['id', 'user', 'rating', 'comment', 'date']
+        fields = ['id', 'user', 'rating', 'comment', 'date', 'upvotes', 'downvotes', 'helpfulness']
+        read_only_fields = ['upvotes', 'downvotes', 'helpfulness']
 
 class ProductSerializer(serializers.ModelSerializer):
-    reviews = ReviewSerializer(many=True, read_only=True)
+    """
+    Full product representation with optional sparse fieldsets.
 
-    
-    calories = serializers.SerializerMethodField()
-    protein = serializers.SerializerMethodField()
-    carbs = serializers.SerializerMethodField()
-    fat = serializers.SerializerMethodField()
-    fiber = serializers.SerializerMethodField()
+    Pass `fields` to keep only the named fields and `expand` to add expandable
+    relations on top of them. `list_fields` is the compact shape used by listings.
+    """
+    reviews = ReviewSerializer(many=True, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'price', 'rating', 'description', 'image',
-            'weight', 'origin', 'organic', 'storage',
+            'id', 'sku', 'name', 'price', 'rating', 'review_count', 'rating_histogram',
+            'description', 'image', 'weight', 'origin', 'organic', 'storage',
             'calories', 'protein', 'carbs', 'fat', 'fiber',
             'reviews'
         ]
+        read_only_fields = ['review_count', 'calories', 'protein', 'carbs', 'fat', 'fiber']
 
-    def get_calories(self, obj):
-        return obj.nutrition.get('calories', '')
+    list_fields = ['id', 'name', 'price', 'rating', 'review_count', 'image']
+    expandable_fields = ['reviews']
+    # Serializer fields that are computed from other model columns.
+    source_columns = {
+        'rating_histogram': [f'rating_{stars}_count' for stars in range(1, 6)],
+    }
 
-    def get_protein(self, obj):
-        return obj.nutrition.get('protein', '')
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            allowed = set(fields) | set(expand or ())
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
 
-    def get_carbs(self, obj):
-        return obj.nutrition.get('carbs', '')
+    @classmethod
+    def select_fields(cls, fields=None, expand=None, default=None):
+        """
+        Resolve requested field names against what the serializer can render.
+        """
+        known = cls.Meta.fields
+        if fields:
+            selected = [name for name in fields if name in known]
+        else:
+            selected = list(default if default is not None else known)
+        selected += [name for name in expand or () if name in cls.expandable_fields and name not in selected]
+        if 'id' not in selected:
+            selected.insert(0, 'id')
+        return selected
 
-    def get_fat(self, obj):
-        return obj.nutrition.get('fat', '')
+    @classmethod
+    def setup_queryset(cls, queryset, fields):
+        """
+        Load only the columns (and relations) the selected fields read.
+        """
+        columns = {'id'}
+        for name in fields:
+            if name in cls.source_columns:
+                columns.update(cls.source_columns[name])
+            elif name not in cls.expandable_fields:
+                columns.add(name)
+        queryset = queryset.only(*columns)
+        if 'reviews' in fields:
+            queryset = queryset.prefetch_related('reviews__user')
+        return queryset
 
-    def get_fiber(self, obj):
-        return obj.nutrition.get('fiber', '')
 
 class RelatedProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.categories.models import Category
+from core.cache import bump_version, touch_markers
+
+from .aggregates import apply_review_delta
+from .cache import invalidate_product, touch_catalog_markers
+from .facets import CATALOG_VERSION, FACETS_MARKER, rating_buckets
+from .models import Product, Review
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """
+    Keep the search index in step with product saves, including soft deletes.
+    """
+    if raw:
+        return
+    get_search_backend().index_products([instance])
+
+
+@receiver(pre_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Category names are searchable, so a rename re-indexes the category's products.
+    """
+    if raw or created:
+        return
+    products = Product.active.filter(category=instance).select_related('category')
+    get_search_backend().index_products(list(products))
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    """
+    Capture the stored product and rating of an edited review before it changes.
+    """
+    instance._stored_rating = None
+    if raw or instance.pk is None:
+        return
+    instance._stored_rating = (
+        Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+    )
+
+
+def apply_review_deltas(*deltas):
+    """
+    Apply `(product_id, rating, delta)` review deltas in one transaction.
+
+    The facet indexes are only told about it when a product's rating moved into
+    another rating bucket; smaller moves are picked up by their next refresh.
+    """
+    product_ids = {product_id for product_id, _, _ in deltas}
+    with transaction.atomic():
+        before = rating_buckets(product_ids, lock=True)
+        for delta in deltas:
+            apply_review_delta(*delta)
+        if rating_buckets(product_ids) != before:
+            transaction.on_commit(touch_facets_marker)
+
+
+@receiver(post_save, sender=Review)
+def update_review_aggregates(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.product_id, instance.rating)
+    previous = None if created else getattr(instance, '_stored_rating', None)
+    if previous == current:
+        return
+    deltas = [(*current, 1)]
+    if previous is not None:
+        deltas.insert(0, (*previous, -1))
+    apply_review_deltas(*deltas)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_aggregates(sender, instance, **kwargs):
+    apply_review_deltas((instance.product_id, instance.rating, -1))
+
+
+def touch_facets_marker():
+    touch_markers(FACETS_MARKER)
+
+
+@receiver(post_save, sender=Product)
+def refresh_facet_indexes(sender, raw=False, **kwargs):
+    """
+    A product save is folded into the per-worker facet indexes once it commits.
+    """
+    if not raw:
+        transaction.on_commit(touch_facets_marker)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, raw=False, **kwargs):
+    """
+    Hard deletes and category writes cannot be read back from `updated_at`, so
+    they rebuild the per-worker facet and suggestion indexes once they commit.
+    """
+    if not raw:
+        transaction.on_commit(lambda: bump_version(CATALOG_VERSION))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, raw=False, **kwargs):
+    """
+    Cache versions and change markers move once the write commits; moved earlier, a
+    reader could rebuild the old row under the new version.
+    """
+    if not raw:
+        product_id = instance.pk
+        transaction.on_commit(lambda: invalidate_product(product_id))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_reviewed_product_cache(sender, instance, raw=False, **kwargs):
+    """
+    A review write changes the product's reviews and aggregates; an edit that moves
+    the review also invalidates the product it came from.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_stored_rating', None)
+    product_ids = (instance.product_id, previous[0] if previous else None)
+    transaction.on_commit(lambda: invalidate_product(*product_ids))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, raw=False, **kwargs):
+    instance._stored_category_id = None
+    if not raw and instance.pk is not None:
+        instance._stored_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def touch_product_markers(sender, instance, raw=False, **kwargs):
+    """
+    Product writes change the product list and the listings of the categories the
+    product is, or was, in.
+    """
+    if not raw:
+        category_ids = [instance.category_id, getattr(instance, '_stored_category_id', None)]
+        transaction.on_commit(lambda: touch_catalog_markers(category_ids=category_ids))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def touch_reviewed_product_markers(sender, instance, raw=False, **kwargs):
+    """
+    Review writes move the rating and review count shown in product listings.
+    """
+    if raw:
+        return
+    product_ids = {instance.product_id}
+    previous = getattr(instance, '_stored_rating', None)
+    if previous:
+        product_ids.add(previous[0])
+    category_ids = list(Product.objects.filter(id__in=product_ids).values_list('category_id', flat=True))
+    transaction.on_commit(lambda: touch_catalog_markers(category_ids=category_ids))
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_slug(sender, instance, raw=False, **kwargs):
+    instance._stored_slug = None
+    if not raw and instance.pk is not None:
+        instance._stored_slug = Category.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def touch_category_markers(sender, instance, raw=False, **kwargs):
+    if not raw:
+        slugs = {instance.slug, getattr(instance, '_stored_slug', None)} - {None}
+        transaction.on_commit(lambda: touch_catalog_markers(slugs=slugs, categories=True))
@@ -0,0 +1,102 @@
+import random
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import StockShard
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(f'Insufficient stock for products {self.product_ids}')
+
+
+def shard_counts(product_ids):
+    """
+    Return `{product_id: number of shards}` for the stock-tracked products among `product_ids`.
+    """
+    return dict(
+        StockShard.objects.filter(product_id__in=product_ids)
+        .order_by().values('product_id').annotate(shards=Count('id'))
+        .values_list('product_id', 'shards')
+    )
+
+
+def get_stock(product_ids):
+    return dict(
+        StockShard.objects.filter(product_id__in=product_ids)
+        .order_by().values('product_id').annotate(stock=Sum('quantity'))
+        .values_list('product_id', 'stock')
+    )
+
+
+def set_stock(product_id, quantity, shards=1):
+    """
+    Replace a product's stock with `quantity` spread evenly over `shards` rows.
+    """
+    base, extra = divmod(quantity, shards)
+    with transaction.atomic():
+        StockShard.objects.filter(product_id=product_id).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product_id, shard=shard, quantity=base + (shard < extra))
+            for shard in range(shards)
+        ])
+
+
+def _take(product_id, quantity, shards):
+    # Guarded decrements never read-modify-write: a shard that cannot cover the
+    # line simply matches no row. Start at a random shard to spread contention.
+    start = random.randrange(shards)
+    for offset in range(shards):
+        shard = (start + offset) % shards
+        if StockShard.objects.filter(
+            product_id=product_id, shard=shard, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity):
+            return True
+    if shards == 1:
+        return False
+    # No single shard covers the line: take it from several under a lock.
+    rows = list(
+        StockShard.objects.select_for_update()
+        .filter(product_id=product_id, quantity__gt=0).order_by('shard')
+    )
+    if sum(row.quantity for row in rows) < quantity:
+        return False
+    for row in rows:
+        taken = min(row.quantity, quantity)
+        row.quantity -= taken
+        quantity -= taken
+    StockShard.objects.bulk_update(rows, ['quantity'])
+    return True
+
+
+def reserve_stock(items):
+    """
+    Take `{product_id: quantity}` out of stock, all or nothing; raise `OutOfStock` otherwise.
+
+    Each tracked product costs one guarded `UPDATE ... WHERE quantity >= n` in the
+    common case. Products are visited in id order, so concurrent reservations lock
+    rows in the same order and cannot deadlock. Untracked products are skipped.
+    """
+    shards = shard_counts(items)
+    with transaction.atomic():
+        short = [
+            product_id
+            for product_id in sorted(shards)
+            if items[product_id] > 0 and not _take(product_id, items[product_id], shards[product_id])
+        ]
+        if short:
+            raise OutOfStock(short)
+
+
+def release_stock(items):
+    """
+    Put `{product_id: quantity}` back into stock, each line into a random shard.
+    """
+    shards = shard_counts(items)
+    with transaction.atomic():
+        for product_id in sorted(shards):
+            StockShard.objects.filter(
+                product_id=product_id, shard=random.randrange(shards[product_id])
+            ).update(quantity=F('quantity') + items[product_id])
@@ -0,0 +1,223 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.db.models import Count
+
+from core.cache import get_markers, get_version
+
+from .cache import CATEGORIES_MARKER, PRODUCTS_MARKER
+from .facets import CATALOG_VERSION
+from .models import Product
+
+MAX_KEY_LENGTH = 64
+MAX_WORD_OFFSETS = 4
+MAX_SUGGESTIONS = 20
+# Prefixes up to this length match large slices, so their rankings are precomputed.
+SHORT_PREFIX_LENGTH = 3
+
+
+def normalize_query(text):
+    return ' '.join((text or '').lower().split())[:MAX_KEY_LENGTH]
+
+
+def suggestion_keys(name):
+    """
+    Index a name under itself and under each later word, so "Green Apple" also
+    completes "app".
+    """
+    words = normalize_query(name).split(' ')
+    return {' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(min(len(words), MAX_WORD_OFFSETS)) if words[i]}
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index over active product names and category names.
+
+    Keys live in one sorted list, so a prefix is a contiguous slice found with two
+    bisects; the slice is ranked by popularity (orders plus reviews for products,
+    the sum of their products for categories). Rankings for short prefixes, whose
+    slices are large, are computed ahead of time. Product writes are folded in
+    incrementally from `updated_at`; hard deletes, which leave no row to read back,
+    and category writes trigger a full rebuild.
+    """
+    max_cached_queries = 1024
+
+    def __init__(self):
+        self.keys = []
+        self.entries = []
+        self.items = {}
+        self.item_keys = {}
+        self.watermark = None
+        self.short = {}
+        self._results = {}
+
+    @classmethod
+    def build(cls):
+        from apps.categories.models import Category
+        from apps.orders.models import OrderItem
+
+        index = cls()
+        orders = dict(
+            OrderItem.objects.order_by().values('product_id').annotate(orders=Count('id'))
+            .values_list('product_id', 'orders')
+        )
+        category_weights = {}
+        rows = Product.active.values_list('id', 'name', 'review_count', 'category_id', 'updated_at')
+        for product_id, name, review_count, category_id, updated_at in rows.iterator(chunk_size=5000):
+            weight = orders.get(product_id, 0) + review_count
+            index._set(('product', product_id), {'type': 'product', 'id': product_id, 'name': name}, weight)
+            if category_id:
+                category_weights[category_id] = category_weights.get(category_id, 0) + weight + 1
+            if index.watermark is None or updated_at > index.watermark:
+                index.watermark = updated_at
+        for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            item = {'type': 'category', 'id': category_id, 'name': name, 'slug': slug}
+            index._set(('category', category_id), item, category_weights.get(category_id, 0))
+
+        pairs = sorted(
+            (key, item_id) for item_id, keys in index.item_keys.items() for key in keys
+        )
+        index.keys = [key for key, _ in pairs]
+        index.entries = [item_id for _, item_id in pairs]
+        index._rank_short_prefixes({key[:length] for key in index.keys for length in range(1, SHORT_PREFIX_LENGTH + 1)})
+        return index
+
+    def _set(self, item_id, item, weight):
+        self.items[item_id] = (item, weight)
+        self.item_keys[item_id] = suggestion_keys(item['name'])
+
+    def _insert(self, item_id, item, weight):
+        self._set(item_id, item, weight)
+        for key in self.item_keys[item_id]:
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.entries.insert(position, item_id)
+
+    def _remove(self, item_id):
+        for key in self.item_keys.pop(item_id, ()):
+            position = bisect_left(self.keys, key)
+            while position < len(self.keys) and self.keys[position] == key:
+                if self.entries[position] == item_id:
+                    del self.keys[position]
+                    del self.entries[position]
+                    break
+                position += 1
+        self.items.pop(item_id, None)
+
+    def copy(self):
+        index = type(self)()
+        index.keys = list(self.keys)
+        index.entries = list(self.entries)
+        index.items = dict(self.items)
+        index.item_keys = dict(self.item_keys)
+        index.watermark = self.watermark
+        index.short = dict(self.short)
+        return index
+
+    def _rank(self, prefix, limit):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_right(self.keys, prefix + '\U0010ffff', lo=start)
+        candidates = {self.entries[position] for position in range(start, end)}
+        ranked = heapq.nsmallest(
+            limit, candidates,
+            key=lambda item_id: (-self.items[item_id][1], item_id[0] != 'category', self.items[item_id][0]['name']),
+        )
+        return [self.items[item_id][0] for item_id in ranked]
+
+    def _rank_short_prefixes(self, prefixes):
+        for prefix in prefixes:
+            ranked = self._rank(prefix, MAX_SUGGESTIONS)
+            if ranked:
+                self.short[prefix] = ranked
+            else:
+                self.short.pop(prefix, None)
+
+    def refresh(self):
+        """
+        Fold in products written since the last build or refresh.
+
+        Mutates the index in place; callers serving requests refresh a `copy()`.
+        """
+        from apps.orders.models import OrderItem
+
+        changed = Product.objects.values_list('id', 'name', 'review_count', 'is_active', 'updated_at')
+        if self.watermark is not None:
+            changed = changed.filter(updated_at__gte=self.watermark)
+        changed = list(changed)
+        orders = dict(
+            OrderItem.objects.filter(product_id__in=[row[0] for row in changed])
+            .order_by().values('product_id').annotate(orders=Count('id'))
+            .values_list('product_id', 'orders')
+        )
+        touched = set()
+        for product_id, name, review_count, is_active, updated_at in changed:
+            item_id = ('product', product_id)
+            touched.update(self.item_keys.get(item_id, ()))
+            self._remove(item_id)
+            if is_active:
+                weight = orders.get(product_id, 0) + review_count
+                self._insert(item_id, {'type': 'product', 'id': product_id, 'name': name}, weight)
+                touched.update(self.item_keys[item_id])
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+        self._rank_short_prefixes({key[:length] for key in touched for length in range(1, SHORT_PREFIX_LENGTH + 1)})
+        self._results.clear()
+        return len(changed)
+
+    def suggest(self, query, limit=8):
+        prefix = normalize_query(query)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            return self.short.get(prefix, [])[:limit]
+        cache_key = (prefix, limit)
+        if cache_key in self._results:
+            return self._results[cache_key]
+
+        results = self._rank(prefix, limit)
+        if len(self._results) >= self.max_cached_queries:
+            self._results.clear()
+        self._results[cache_key] = results
+        return results
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_markers = None
+_built_at = 0.0
+
+# Order counts only change on a full rebuild, so rebuild at least this often.
+REBUILD_INTERVAL = 3600
+
+
+def get_suggest_index():
+    """
+    Return this worker's suggestion index, refreshed when the catalog markers moved
+    and rebuilt when the catalog version or the categories marker moved.
+
+    Readers never see a half-applied refresh: changes are applied to a copy that
+    then replaces the published index.
+    """
+    global _index, _index_version, _markers, _built_at
+    version = get_version(CATALOG_VERSION)
+    markers = get_markers(PRODUCTS_MARKER, CATEGORIES_MARKER)
+    expired = time.monotonic() - _built_at > REBUILD_INTERVAL
+    if _index is not None and (version, markers) == (_index_version, _markers) and not expired:
+        return _index
+    with _lock:
+        if (
+            _index is None or expired or version != _index_version
+            or markers[CATEGORIES_MARKER] != _markers[CATEGORIES_MARKER]
+        ):
+            _index = SuggestIndex.build()
+            _built_at = time.monotonic()
+        elif markers != _markers:
+            index = _index.copy()
+            index.refresh()
+            _index = index
+        _index_version, _markers = version, markers
+    return _index
@@ -1,3 +1,740 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from apps.categories.models import Category
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.cache import get_markers, get_version
+
+from . import export
+from .aggregates import rebuild_review_aggregates
+from .cache import product_cache_key, product_version_name
+from .facets import FACETS_MARKER, FacetIndex
+from .models import ArchivedProduct, CoPurchase, Product, Review, SearchPosting, StockShard
+from .nutrition import backfill_nutrition
+from .recommendations import fold_new_orders, rebuild_co_purchase_index
+from .search import get_search_backend
+from .serializers import ProductSerializer
+from .suggest import SuggestIndex, get_suggest_index
+from .stock import OutOfStock, get_stock, release_stock, reserve_stock, set_stock
+
+
+def make_product(name='Apple'):
+    return Product.objects.create(name=name, price='1.00', description='', image='http://example.com/p.png')
+
+
+def make_user(email='shopper@example.com'):
+    return get_user_model().objects.create_user(email=email, name='Shopper', password='secret')
+
+
+class ProductListPaginationTests(TestCase):
+    def setUp(self):
+        for number, price in enumerate(['3.00', '1.00', '2.00', '1.00', '3.00', '2.00', '1.00']):
+            Product.objects.create(
+                name=f'Product {number % 3}', price=price, description='', image='http://example.com/p.png'
+            )
+
+    def walk(self, ordering):
+        ids, url = [], f'/api/products/?ordering={ordering}&page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            ids += [row['id'] for row in page['results']]
+            url = page['next']
+        return ids
+
+    def test_cursor_walk_has_no_duplicates_or_gaps(self):
+        for ordering in ('price', '-price', 'name', '-id'):
+            tiebreak = '-id' if ordering.startswith('-') else 'id'
+            expected = list(Product.active.order_by(ordering, tiebreak).values_list('id', flat=True))
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.walk(ordering), expected)
+
+    def test_cursor_is_bound_to_its_ordering(self):
+        next_url = self.client.get('/api/products/?ordering=price&page_size=2').json()['next']
+        cursor = parse_qs(urlparse(next_url).query)['cursor'][0]
+        self.assertEqual(self.client.get(f'/api/products/?ordering=name&cursor={cursor}').status_code, 404)
+        self.assertEqual(self.client.get('/api/products/?cursor=not-a-cursor').status_code, 404)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.apple = make_product('Apple')
+        Review.objects.create(product=self.apple, user=make_user(), rating=5, comment='Sweet')
+
+    def test_list_uses_the_compact_shape(self):
+        row = self.client.get('/api/products/').json()['results'][0]
+        self.assertEqual(list(row), ProductSerializer.list_fields)
+
+    def test_fields_and_expand_select_the_payload(self):
+        url = f'/api/products/{self.apple.id}/'
+        self.assertEqual(self.client.get(f'{url}?fields=name,price,bogus').json(), {
+            'id': self.apple.id, 'name': 'Apple', 'price': '1.00',
+        })
+        payload = self.client.get(f'{url}?fields=name&expand=reviews').json()
+        self.assertEqual(list(payload), ['id', 'name', 'reviews'])
+        self.assertEqual([review['comment'] for review in payload['reviews']], ['Sweet'])
+
+    def test_selected_columns_bound_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products/?fields=name')
+        table = Product._meta.db_table
+        [sql] = [query['sql'] for query in queries.captured_queries if f'FROM "{table}"' in query['sql']]
+        self.assertIn('"name"', sql)
+        self.assertNotIn('"description"', sql)
+
+
+class ReviewAggregateTests(TestCase):
+    def setUp(self):
+        self.apple, self.pear = make_product('Apple'), make_product('Pear')
+
+    def aggregates(self, product):
+        product.refresh_from_db()
+        return product.review_count, product.rating_sum, product.rating, product.rating_histogram
+
+    def test_edits_moves_and_deletes_keep_aggregates_exact(self):
+        first = Review.objects.create(product=self.apple, user=make_user('a@example.com'), rating=5, comment='')
+        Review.objects.create(product=self.apple, user=make_user('b@example.com'), rating=3, comment='')
+        self.assertEqual(self.aggregates(self.apple), (2, 8, 4.0, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}))
+
+        first.rating = 1
+        first.save()
+        self.assertEqual(self.aggregates(self.apple), (2, 4, 2.0, {1: 1, 2: 0, 3: 1, 4: 0, 5: 0}))
+
+        first.product = self.pear
+        first.save()
+        self.assertEqual(self.aggregates(self.apple), (1, 3, 3.0, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0}))
+        self.assertEqual(self.aggregates(self.pear), (1, 1, 1.0, {1: 1, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+        first.delete()
+        self.assertEqual(self.aggregates(self.pear)[:2], (0, 0))
+
+    def test_rebuild_matches_incremental_counts(self):
+        Review.objects.create(product=self.apple, user=make_user('a@example.com'), rating=4, comment='')
+        Review.objects.create(product=self.pear, user=make_user('b@example.com'), rating=2, comment='')
+        expected = [self.aggregates(self.apple), self.aggregates(self.pear)]
+        Product.objects.update(review_count=9, rating_sum=9, rating_2_count=9)
+
+        self.assertEqual(rebuild_review_aggregates(), 2)
+        self.assertEqual([self.aggregates(self.apple), self.aggregates(self.pear)], expected)
+
+    def test_migration_counts_reviews_written_before_it(self):
+        review = Review.objects.create(product=self.apple, user=make_user('a@example.com'), rating=4, comment='')
+        Product.objects.update(review_count=0, rating_sum=0, rating_4_count=0)
+        migration = import_module('apps.products.migrations.0004_review_aggregates')
+
+        migration.count_existing_reviews(django_apps, None)
+        self.assertEqual(self.aggregates(self.apple)[:2], (1, 4))
+        review.delete()
+        self.assertEqual(self.aggregates(self.apple)[:2], (0, 0))
+
+
+class NutritionTests(TestCase):
+    def product(self, name, nutrition):
+        return Product.objects.create(
+            name=name, price='1.00', description='', image='http://example.com/p.png', nutrition=nutrition
+        )
+
+    def test_save_parses_free_form_values(self):
+        oats = self.product('Oats', {'calories': '389 kcal per 100g', 'protein': '16,9 g', 'fat': 'n/a'})
+        self.assertEqual((oats.calories, oats.protein, oats.fat, oats.fiber), (389.0, 16.9, None, None))
+
+        oats.nutrition = {'calories': 380}
+        oats.save(update_fields=['nutrition'])
+        oats.refresh_from_db()
+        self.assertEqual((oats.calories, oats.protein), (380.0, None))
+
+    def test_comparisons_filter_the_listing(self):
+        oats = self.product('Oats', {'calories': 389, 'protein': 17})
+        apple = self.product('Apple', {'calories': 52, 'protein': 0.3})
+        self.product('Mystery', {})
+
+        def ids(query):
+            return [row['id'] for row in self.client.get(f'/api/products/?{query}').json()['results']]
+
+        self.assertEqual(ids('calories%3C200'), [apple.id])
+        self.assertEqual(ids('protein%3E=10'), [oats.id])
+        self.assertEqual(ids('calories__gte=52&protein__lt=1'), [apple.id])
+        self.assertEqual(ids('calories%3C10'), [])
+
+
+class ConditionalGetTests(TestCase):
+    def test_unchanged_list_answers_304_until_a_write(self):
+        apple = make_product('Apple')
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get('/api/products/?ordering=price')['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apple.price = '2.00'
+            apple.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bulk_repairs_refresh_listings_and_cached_details(self):
+        apple = make_product('Apple')
+        Review.objects.create(product=apple, user=make_user('a@example.com'), rating=4, comment='')
+        Product.objects.filter(pk=apple.pk).update(review_count=7)
+        etag = self.client.get('/api/products/')['ETag']
+        self.assertEqual(self.client.get(f'/api/products/{apple.id}/').json()['review_count'], 7)
+
+        call_command('rebuild_review_aggregates', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/products/{apple.id}/').json()['review_count'], 1)
+
+        etag = self.client.get('/api/products/')['ETag']
+        Product.objects.filter(pk=apple.pk).update(nutrition={'calories': 52})
+        call_command('backfill_nutrition', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/products/{apple.id}/').json()['calories'], 52.0)
+
+
+class ReviewFeedTests(TestCase):
+    def setUp(self):
+        self.apple = make_product('Apple')
+        self.reviews = [
+            Review.objects.create(
+                product=self.apple, user=make_user(f'{number}@example.com'), rating=number % 5 + 1,
+                comment='', upvotes=number % 3,
+            )
+            for number in range(7)
+        ]
+        Review.objects.create(product=make_product('Pear'), user=make_user(), rating=5, comment='')
+
+    def walk(self, ordering):
+        ids, url = [], f'/api/products/{self.apple.id}/reviews/?ordering={ordering}&page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            ids += [review['id'] for review in page['results']]
+            url = page['next']
+        return ids
+
+    def test_every_ordering_walks_the_feed_once(self):
+        reviews = Review.objects.filter(product=self.apple)
+        for ordering, fields in (('helpful', ('-helpfulness', '-id')), ('lowest', ('rating', 'id')), ('newest', ('-date', '-id'))):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.walk(ordering), list(reviews.order_by(*fields).values_list('id', flat=True)))
+
+
+class ReviewVoteTests(TestCase):
+    def setUp(self):
+        self.review = Review.objects.create(product=make_product(), user=make_user(), rating=4, comment='')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('voter@example.com'))
+
+    def test_one_vote_per_user(self):
+        url = f'/api/reviews/{self.review.id}/upvote/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['helpfulness'], 1)
+
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertEqual(self.client.post(f'/api/reviews/{self.review.id}/downvote/').status_code, 409)
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.upvotes, self.review.downvotes, self.review.helpfulness), (1, 0, 1))
+
+    def test_vote_refreshes_the_cached_feed(self):
+        feed = f'/api/products/{self.review.product_id}/reviews/'
+        self.assertEqual(self.client.get(feed).json()['results'][0]['upvotes'], 0)
+        self.client.post(f'/api/reviews/{self.review.id}/downvote/')
+        self.assertEqual(self.client.get(feed).json()['results'][0]['downvotes'], 1)
+
+
+class SoftDeleteTests(TestCase):
+    def test_soft_deleted_products_leave_public_reads(self):
+        apple, pear = make_product('Apple'), make_product('Pear')
+        Review.objects.create(product=apple, user=make_user(), rating=4, comment='')
+        apple.delete()
+
+        self.assertEqual([row['id'] for row in self.client.get('/api/products/').json()['results']], [pear.id])
+        self.assertEqual(self.client.get(f'/api/products/{apple.id}/').status_code, 404)
+        apple.refresh_from_db()
+        self.assertEqual((apple.is_active, apple.review_count), (False, 1))
+
+    def test_archive_moves_only_long_inactive_unordered_products(self):
+        from apps.orders.models import Order, OrderItem
+
+        apple, pear, plum = make_product('Apple'), make_product('Pear'), make_product('Plum')
+        Review.objects.create(product=apple, user=make_user(), rating=4, comment='Crisp')
+        order = Order.objects.create(user=make_user('buyer@example.com'), order_id='ORD-T1', total=1)
+        OrderItem.objects.create(order=order, product=pear, quantity=1, price=1)
+        for product in (apple, pear, plum):
+            product.delete()
+        long_ago = timezone.now() - timedelta(days=365)
+        Product.objects.filter(pk__in=[apple.pk, pear.pk]).update(updated_at=long_ago)
+
+        call_command('archive_products', days=180, stdout=io.StringIO())
+
+        self.assertEqual(sorted(Product.objects.values_list('name', flat=True)), ['Pear', 'Plum'])
+        archived = ArchivedProduct.objects.get()
+        self.assertEqual((archived.product_id, archived.name), (apple.id, 'Apple'))
+        self.assertEqual([review['comment'] for review in archived.data['reviews']], ['Crisp'])
+        self.assertFalse(Review.objects.exists())
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        self.fruits = Category.objects.create(name='Fruits', slug='fruits')
+        self.apple = make_product('Green Apple')
+        self.juice = make_product('Apple Juice')
+        Review.objects.create(product=self.juice, user=make_user(), rating=5, comment='')
+
+    def names(self, index, query):
+        return [item['name'] for item in index.suggest(query)]
+
+    def test_prefixes_match_any_word_ranked_by_popularity(self):
+        index = SuggestIndex.build()
+        self.assertEqual(self.names(index, 'app'), ['Apple Juice', 'Green Apple'])
+        self.assertEqual(self.names(index, 'apple j'), ['Apple Juice'])
+        self.assertEqual(self.names(index, 'FRU'), ['Fruits'])
+        self.assertEqual(index.suggest('zz'), [])
+
+    def test_refresh_matches_rebuild(self):
+        index = SuggestIndex.build()
+        self.apple.delete()
+        self.juice.name = 'Orange Juice'
+        self.juice.save()
+        make_product('Apricot')
+
+        index.refresh()
+        rebuilt = SuggestIndex.build()
+        for query in ('a', 'ap', 'apple', 'juice', 'or'):
+            with self.subTest(query=query):
+                self.assertEqual(index.suggest(query), rebuilt.suggest(query))
+        self.assertEqual(self.names(index, 'ap'), ['Apricot'])
+
+    def test_hard_deletes_leave_the_published_index(self):
+        self.assertIn('Green Apple', self.names(get_suggest_index(), 'green'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.apple.pk).delete()
+        self.assertEqual(self.names(get_suggest_index(), 'green'), [])
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        Category.objects.create(name='Fruits', slug='fruits')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_feed(self, name, rows):
+        path = Path(self.directory.name) / name
+        if name.endswith('.csv'):
+            header = 'sku,name,price,category\n'
+            path.write_text(header + ''.join(f'{row}\n' for row in rows), encoding='utf-8')
+        else:
+            path.write_text(''.join(f'{json.dumps(row)}\n' for row in rows), encoding='utf-8')
+        return str(path)
+
+    def run_import(self, path, **options):
+        call_command('import_products', path, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_rows_are_upserted_by_sku(self):
+        self.run_import(self.write_feed('feed.ndjson', [
+            {'sku': 'A-1', 'name': 'Green Apple', 'price': '1.20', 'category': 'fruits'},
+            {'sku': 'B-1', 'name': 'Banana', 'price': '0.50'},
+        ]))
+        self.run_import(self.write_feed('update.csv', ['A-1,Red Apple,1.40,fruits']))
+
+        self.assertEqual(Product.objects.count(), 2)
+        apple = Product.objects.get(sku='A-1')
+        self.assertEqual((apple.name, str(apple.price), apple.category.slug), ('Red Apple', '1.40', 'fruits'))
+
+    def test_moving_a_sku_changes_both_category_etags(self):
+        Category.objects.create(name='Dairy', slug='dairy')
+        self.run_import(self.write_feed('feed.ndjson', [{'sku': 'A-1', 'name': 'Apple', 'price': '1.20', 'category': 'fruits'}]))
+        fruits = self.client.get('/api/categories/fruits/')['ETag']
+
+        self.run_import(self.write_feed('update.ndjson', [{'sku': 'A-1', 'name': 'Apple', 'price': '1.20', 'category': 'dairy'}]))
+        self.assertEqual(self.client.get('/api/categories/fruits/', HTTP_IF_NONE_MATCH=fruits).status_code, 200)
+
+    def test_invalid_rows_are_skipped_or_abort_when_strict(self):
+        path = self.write_feed('feed.ndjson', [
+            {'sku': 'A-1', 'name': 'Apple', 'price': '1.20'},
+            {'sku': 'B-1', 'name': 'Banana', 'price': 'free'},
+            {'sku': 'C-1', 'name': 'Cherry', 'price': '3.00', 'category': 'missing'},
+        ])
+
+        self.run_import(path)
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['A-1'])
+
+        Product.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'Line 2'):
+            self.run_import(path, strict=True)
+
+    def test_reimport_keeps_search_and_review_aggregates_consistent(self):
+        path = self.write_feed('feed.ndjson', [{'sku': 'A-1', 'name': 'Green Apple', 'price': '1.20'}])
+        self.run_import(path)
+        apple = Product.objects.get()
+        Review.objects.create(product=apple, user=make_user(), rating=4, comment='Crisp')
+
+        self.run_import(self.write_feed('update.ndjson', [{'sku': 'A-1', 'name': 'Red Apple', 'price': '1.30'}]))
+        self.run_import(self.write_feed('update.ndjson', [{'sku': 'A-1', 'name': 'Red Apple', 'price': '1.30'}]))
+
+        apple.refresh_from_db()
+        self.assertEqual((apple.review_count, apple.rating_sum, apple.rating_4_count), (1, 4, 1))
+        backend = get_search_backend()
+        self.assertEqual(backend.search('red apple'), [apple.id])
+        self.assertEqual(backend.search('green'), [])
+        self.assertEqual(
+            SearchPosting.objects.filter(product=apple, field='name').count(), 2
+        )
+
+
+class FacetIndexTests(TestCase):
+    def setUp(self):
+        fruits = Category.objects.create(name='Fruits', slug='fruits')
+        dairy = Category.objects.create(name='Dairy', slug='dairy')
+        rows = [
+            ('Apple', '1.00', fruits, 'Spain', True),
+            ('Pear', '6.00', fruits, 'Spain', False),
+            ('Mango', '12.00', fruits, 'Peru', True),
+            ('Milk', '1.50', dairy, None, False),
+            ('Cheese', '25.00', dairy, 'France', False),
+        ]
+        self.products = [
+            Product.objects.create(
+                name=name, price=price, category=category, origin=origin, organic=organic,
+                description='', image='http://example.com/p.png',
+            )
+            for name, price, category, origin, organic in rows
+        ]
+
+    def group_by(self, column, **filters):
+        rows = Product.active.filter(**filters).order_by().values(column).annotate(total=Count('id'))
+        return {row[column]: row['total'] for row in rows if row[column] is not None}
+
+    def test_counts_match_group_by(self):
+        index = FacetIndex.build()
+        count, facets = index.counts({})
+        self.assertEqual(count, Product.active.count())
+        self.assertEqual(facets['category'], self.group_by('category__slug'))
+        self.assertEqual(facets['origin'], self.group_by('origin'))
+        self.assertEqual(facets['organic'], {str(key).lower(): total for key, total in self.group_by('organic').items()})
+        self.assertEqual(facets['price'], {'0-5': 2, '5-10': 1, '10-20': 1, '20-50': 1})
+
+        count, facets = index.counts({'organic': True})
+        self.assertEqual(count, 2)
+        self.assertEqual(facets['origin'], self.group_by('origin', organic=True))
+        self.assertEqual(facets['category'], self.group_by('category__slug', organic=True))
+
+    def test_refresh_matches_rebuild(self):
+        index = FacetIndex.build()
+        apple, pear = self.products[:2]
+        apple.price = '30.00'
+        apple.origin = 'Italy'
+        apple.save()
+        pear.delete()
+        Product.objects.create(
+            name='Plum', price='3.00', category=apple.category, origin='Spain',
+            description='', image='http://example.com/p.png',
+        )
+
+        index.refresh()
+        rebuilt = FacetIndex.build()
+        for filters in ({}, {'origin': ['Spain']}, {'price': (None, Decimal('10'))}, {'category': ['fruits']}):
+            self.assertEqual(index.counts(filters), rebuilt.counts(filters))
+
+    def test_only_rating_bucket_changes_touch_the_marker(self):
+        cheese = self.products[-1]
+        reviews = []
+
+        def review(rating, email):
+            before = get_markers(FACETS_MARKER)
+            with self.captureOnCommitCallbacks(execute=True):
+                reviews.append(Review.objects.create(product=cheese, user=make_user(email), rating=rating, comment=''))
+            return get_markers(FACETS_MARKER) != before
+
+        self.assertTrue(review(4, 'a@example.com'))
+        self.assertFalse(review(5, 'b@example.com'))
+        self.assertTrue(review(1, 'c@example.com'))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.backend = get_search_backend()
+
+    def product(self, name, description=''):
+        return Product.objects.create(name=name, price='1.00', description=description, image='http://example.com/p.png')
+
+    def test_name_matches_outrank_description_matches(self):
+        juice = self.product('Orange Juice', 'Pressed from fresh apples')
+        apple = self.product('Green Apple')
+        pie = self.product('Apple Pie', 'Baked with apples and cinnamon')
+
+        self.assertEqual(self.backend.search('apple'), [pie.id, apple.id, juice.id])
+        self.assertEqual(self.backend.search('green apple'), [apple.id, pie.id, juice.id])
+        self.assertEqual(self.backend.search('apple', limit=1), [pie.id])
+
+    def test_prefixes_and_typos_expand(self):
+        banana = self.product('Banana')
+        self.assertEqual(self.backend.search('ban'), [banana.id])
+        self.assertEqual(self.backend.search('bananna'), [banana.id])
+
+    def test_expansions_are_capped(self):
+        for number in range(30):
+            self.product(f'Cherry{number:02}')
+        expansions = self.backend.expand(['cherry'])[0]
+        self.assertEqual(len(expansions), self.backend.max_expansions)
+
+    def test_soft_deleted_products_drop_out(self):
+        apple = self.product('Green Apple')
+        apple.delete()
+        self.assertEqual(self.backend.search('apple'), [])
+        self.assertFalse(SearchPosting.objects.filter(product=apple).exists())
+
+        apple.is_active = True
+        apple.save()
+        self.assertEqual(self.backend.search('apple'), [apple.id])
+
+    def test_migration_indexes_the_existing_catalog(self):
+        apple = self.product('Green Apple')
+        SearchPosting.objects.all().delete()
+        migration = import_module('apps.products.migrations.0003_search_index')
+
+        migration.index_existing_products(django_apps, None)
+        self.assertEqual(self.backend.search('apple'), [apple.id])
+
+    def test_empty_query_answers_an_empty_page(self):
+        self.product('Green Apple')
+        body = self.client.get('/api/products/search/?q=%20').json()
+        self.assertEqual((body['count'], body['results'], body['next']), (0, [], None))
+
+
+class ExportTests(TestCase):
+    def exported_ids(self, since=None):
+        return [row['id'] for row in export.iter_rows([], since)]
+
+    def test_since_sees_bulk_writes(self):
+        apple, pear = make_product('Apple'), make_product('Pear')
+        since = timezone.now()
+        # drift that bypasses save(), as a bad deploy or manual SQL would leave
+        Product.objects.filter(pk=apple.pk).update(review_count=3, updated_at=apple.updated_at)
+        Product.objects.filter(pk=pear.pk).update(nutrition={'calories': '52 kcal'}, updated_at=pear.updated_at)
+        self.assertEqual(self.exported_ids(since), [])
+
+        rebuild_review_aggregates()
+        self.assertEqual(self.exported_ids(since), [apple.id])
+        backfill_nutrition(Product)
+        self.assertEqual(self.exported_ids(since), [apple.id, pear.id])
+
+        # nothing left to repair: a second run writes nothing
+        since = timezone.now()
+        rebuild_review_aggregates()
+        backfill_nutrition(Product)
+        self.assertEqual(self.exported_ids(since), [])
+
+    def test_endpoint_streams_changes_since_the_watermark(self):
+        make_product('Apple')
+        client = APIClient()
+        self.assertEqual(client.get('/api/admin/products/export/').status_code, 401)
+        client.force_authenticate(get_user_model().objects.create_user(
+            email='admin@example.com', name='Admin', password='secret', is_staff=True
+        ))
+
+        response = client.get('/api/admin/products/export/')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Apple'])
+
+        make_product('Pear')
+        response = client.get('/api/admin/products/export/', {'since': response['X-Export-Watermark']})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Pear'])
+        self.assertEqual(client.get('/api/admin/products/export/?since=yesterday').status_code, 400)
+
+    def test_csv_includes_requested_columns(self):
+        make_product('Apple')
+        content = ''.join(export.stream_csv(export.iter_rows(['nutrition']), export.export_columns(['nutrition'])))
+        header, row = content.splitlines()
+        self.assertIn('calories', header.split(','))
+        self.assertIn('Apple', row)
+
+
+class ProductCacheTests(TestCase):
+    def key(self, path, **extra):
+        return product_cache_key(1, 'reviews', Request(APIRequestFactory().get(path, **extra)))
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_key_covers_origin_but_not_parameter_order(self):
+        key = self.key('/api/products/1/reviews/?ordering=newest&page_size=5')
+        self.assertEqual(key, self.key('/api/products/1/reviews/?page_size=5&ordering=newest'))
+        self.assertNotEqual(key, self.key('/api/products/1/reviews/?ordering=newest&page_size=5', HTTP_HOST='shop.example.com'))
+        self.assertNotEqual(key, self.key('/api/products/1/reviews/?ordering=newest&page_size=5', secure=True))
+
+    def test_product_save_invalidates_cached_payloads(self):
+        apple = make_product('Apple')
+        url = f'/api/products/{apple.id}/'
+        client = APIClient()
+        self.assertEqual(client.get(url).data['name'], 'Apple')
+
+        version = get_version(product_version_name(apple.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            apple.name = 'Red Apple'
+            apple.save()
+            # readers keep the old version until the write commits
+            self.assertEqual(get_version(product_version_name(apple.id)), version)
+        self.assertEqual(client.get(url).data['name'], 'Red Apple')
+
+
+class CoPurchaseIndexTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.products = [make_product(f'Product {i}') for i in range(4)]
+        self.orders = 0
+
+    def place(self, *indexes, age=timedelta(minutes=5)):
+        from apps.orders.models import Order, OrderItem
+
+        self.orders += 1
+        order = Order.objects.create(user=self.user, order_id=f'ORD-T{self.orders}', total=0)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.products[index], quantity=1, price=1) for index in indexes
+        ])
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - age)
+
+    def scores(self):
+        return {
+            (product_id, related_id): score
+            for product_id, related_id, score in CoPurchase.objects.values_list('product_id', 'related_id', 'score')
+        }
+
+    def test_fold_matches_a_rebuild(self):
+        self.place(0, 1, 2)
+        self.place(0, 1)
+        self.place(2, 3)
+
+        self.assertEqual(fold_new_orders(), 3)
+        folded = self.scores()
+        rebuild_co_purchase_index()
+
+        self.assertEqual(folded, self.scores())
+        self.assertEqual(folded[self.products[0].id, self.products[1].id], 2)
+
+    def test_new_pairs_accumulate_until_they_rank(self):
+        first, second, newcomer = self.products[0].id, self.products[1].id, self.products[3].id
+        self.place(0, 1)
+        rebuild_co_purchase_index(top_k=1)
+        for _ in range(2):
+            self.place(0, 3)
+
+        fold_new_orders()
+
+        top = CoPurchase.objects.filter(product_id=first).order_by('-score', 'related_id').first()
+        self.assertEqual((top.related_id, top.score), (newcomer, 2))
+        self.assertEqual(self.scores()[first, second], 1)
+
+    def test_each_order_is_folded_once(self):
+        self.place(0, 1)
+        rebuild_co_purchase_index()
+        self.place(0, 1)
+        self.place(0, 1, age=timedelta(0))
+
+        self.assertEqual(fold_new_orders(), 1)
+        self.assertEqual(fold_new_orders(), 0)
+        self.assertEqual(self.scores()[self.products[0].id, self.products[1].id], 2)
+
+
+class StockTests(TestCase):
+    def setUp(self):
+        self.product = make_product()
+
+    def test_set_stock_splits_evenly(self):
+        set_stock(self.product.id, 10, shards=4)
+
+        self.assertEqual(
+            list(StockShard.objects.order_by('shard').values_list('quantity', flat=True)), [3, 3, 2, 2]
+        )
+
+    def test_reserve_and_release(self):
+        set_stock(self.product.id, 5)
+
+        reserve_stock({self.product.id: 3})
+        self.assertEqual(get_stock([self.product.id]), {self.product.id: 2})
+        release_stock({self.product.id: 3})
+        self.assertEqual(get_stock([self.product.id]), {self.product.id: 5})
+
+    def test_reservation_spanning_shards(self):
+        set_stock(self.product.id, 6, shards=3)
+
+        reserve_stock({self.product.id: 5})
+
+        self.assertEqual(get_stock([self.product.id]), {self.product.id: 1})
+
+    def test_all_or_nothing(self):
+        other = make_product('Pear')
+        set_stock(self.product.id, 5)
+        set_stock(other.id, 1)
+
+        with self.assertRaises(OutOfStock) as raised:
+            reserve_stock({self.product.id: 2, other.id: 2})
+
+        self.assertEqual(raised.exception.product_ids, [other.id])
+        self.assertEqual(get_stock([self.product.id, other.id]), {self.product.id: 5, other.id: 1})
+
+    def test_untracked_products_are_not_limited(self):
+        reserve_stock({self.product.id: 1000})
+
+        self.assertFalse(StockShard.objects.exists())
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    threads = 8
+    attempts_per_thread = 20
+    stock = 100
+    shards = 4
+
+    def test_no_oversell_under_contention(self):
+        product = make_product()
+        set_stock(product.id, self.stock, shards=self.shards)
+        reserved = []
+        errors = []
+        start = threading.Barrier(self.threads)
+
+        def worker():
+            try:
+                start.wait()
+                for _ in range(self.attempts_per_thread):
+                    try:
+                        reserve_stock({product.id: 1})
+                        reserved.append(1)
+                    except OutOfStock:
+                        pass
+            except Exception as error:  # pragma: no cover - reported below
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(reserved), self.stock)
+        self.assertEqual(get_stock([product.id]), {product.id: 0})
+
+    def test_bench_command_reports_the_rate(self):
+        output = io.StringIO()
+        call_command('bench_stock', threads=4, attempts=30, stock=100, shards=4, stdout=output)
+        self.assertRegex(output.getvalue(), r'\d+ reservations/sec \(4 threads, 4 shards, 100 reserved\)')
+        self.assertFalse(Product.objects.exists())
@@ -1,19 +1,26 @@
 from django.urls import path
 from .views import (
-    ProductListView, ProductDetailView, ProductSearchView, RelatedProductsView,
-    ProductReviewsView, CreateProductView, UpdateProductView, DeleteProductView
+    ProductListView, ProductFilterView, ProductDetailView, ProductSearchView, RelatedProductsView,
+    ProductReviewsView, CreateProductView, UpdateProductView, DeleteProductView,
+    ExportProductsView, ProductSuggestView, VoteReviewView
 )
+from .models import ReviewVote
 
 urlpatterns = [
     # Public endpoints
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/filter/', ProductFilterView.as_view(), name='product-filter'),
     path('products/<int:id>/', ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:id>/related/', RelatedProductsView.as_view(), name='related-products'),
     path('products/<int:id>/reviews/', ProductReviewsView.as_view(), name='product-reviews'),
      path('products/search/', ProductSearchView.as_view(), name='product-search'),
+    path('products/suggest/', ProductSuggestView.as_view(), name='product-suggest'),
+    path('reviews/<int:id>/upvote/', VoteReviewView.as_view(value=ReviewVote.UP), name='review-upvote'),
+    path('reviews/<int:id>/downvote/', VoteReviewView.as_view(value=ReviewVote.DOWN), name='review-downvote'),
 
     # Admin-only endpoints
     path('admin/products/create/', CreateProductView.as_view(), name='create-product'),
     path('admin/products/<int:id>/update/', UpdateProductView.as_view(), name='update-product'),
     path('admin/products/<int:id>/delete/', DeleteProductView.as_view(), name='delete-product'),
+    path('admin/products/export/', ExportProductsView.as_view(), name='export-products'),
 ]
\ No newline at end of file
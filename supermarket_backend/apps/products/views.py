@@ -1,36 +1,169 @@
-from rest_framework import generics, permissions
-from .models import Product, Review
+from datetime import timezone as dt_timezone
+
+from core.conditional import marker_condition
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, permissions, status
+from . import export
+from .aggregates import apply_review_vote
+from .cache import PRODUCTS_MARKER, ProductCacheMixin, invalidate_product
+from .facets import apply_facet_filters, get_facet_index, parse_facet_filters
+from .models import CoPurchase, Product, Review, ReviewVote
+from .nutrition import apply_nutrition_filters, parse_nutrition_filters
+from .pagination import ProductCursorPagination, ProductSearchPagination, ReviewFeedPagination
+from .search import get_search_backend
 from .serializers import ProductSerializer, RelatedProductSerializer, ReviewSerializer
+from .suggest import MAX_SUGGESTIONS, get_suggest_index
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.all()
+
+class ProductFieldsMixin:
+    """
+    Applies `?fields=` / `?expand=` to the serializer and narrows the queryset to match.
+
+    `default_fields` is the shape returned when no `fields` are requested; `None`
+    means the full representation.
+    """
+    default_fields = None
+
+    def get_selected_fields(self):
+        if not hasattr(self, '_selected_fields'):
+            params = self.request.query_params
+            self._selected_fields = ProductSerializer.select_fields(
+                fields=split_param(params.get('fields')),
+                expand=split_param(params.get('expand')),
+                default=self.default_fields,
+            )
+        return self._selected_fields
+
+    def get_queryset(self):
+        return ProductSerializer.setup_queryset(super().get_queryset(), self.get_selected_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['fields'] = self.get_selected_fields()
+        return super().get_serializer(*args, **kwargs)
+
+
+def split_param(value):
+    if not value:
+        return []
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+@marker_condition(lambda request, **kwargs: [PRODUCTS_MARKER])
+class ProductListView(ProductFieldsMixin, generics.ListAPIView):
+    """
+    Cursor-paginated catalog. Nutrition comparisons such as `?calories<200&protein>=10`
+    filter on the indexed nutrient columns.
+    """
+    queryset = Product.active.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ProductCursorPagination
+    default_fields = ProductSerializer.list_fields
 
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
+    def get_queryset(self):
+        self.nutrition_filters = parse_nutrition_filters(self.request.query_params)
+        return apply_nutrition_filters(super().get_queryset(), self.nutrition_filters)
+
+class ProductFilterView(ProductListView):
+    """
+    Catalog listing filtered by facets, with per-facet counts for the sidebar.
+
+    Matching products come from the database through the usual cursor pagination;
+    the counts come from the in-memory facet index.
+    """
+
+    def get_queryset(self):
+        self.filters = parse_facet_filters(self.request.query_params)
+        return apply_facet_filters(super().get_queryset(), self.filters)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        count, facets = get_facet_index().counts(self.filters, self.nutrition_filters)
+        response.data['count'] = count
+        response.data['facets'] = facets
+        return response
+
+class ProductDetailView(ProductCacheMixin, ProductFieldsMixin, generics.RetrieveAPIView):
+    cache_name = 'detail'
+    queryset = Product.active.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'id'
 
-class RelatedProductsView(generics.ListAPIView):
+class RelatedProductsView(ProductCacheMixin, generics.ListAPIView):
+    cache_name = 'related'
     serializer_class = RelatedProductSerializer
     permission_classes = [permissions.AllowAny]
 
+    limit = 5
+
     def get_queryset(self):
+        """
+        Rank by co-purchase score, topping up with same-category products when a
+        product has too little order history.
+        """
         product_id = self.kwargs['id']
-        product = Product.objects.get(id=product_id)
-        return Product.objects.exclude(id=product_id).filter(category=product.category)[:5]
+        columns = RelatedProductSerializer.Meta.fields
+        related = [
+            row.related for row in CoPurchase.objects.filter(product_id=product_id, related__is_active=True)
+            .select_related('related')
+            .only(*(f'related__{column}' for column in columns), 'product')
+            .order_by('-score', 'related_id')[:self.limit]
+        ]
+        if len(related) < self.limit:
+            seen = [product.id for product in related] + [product_id]
+            related += list(
+                Product.active.filter(category__products__id=product_id)
+                .exclude(id__in=seen)
+                .only(*columns)[:self.limit - len(related)]
+            )
+        return related
 
-class ProductReviewsView(generics.ListAPIView):
+class ProductReviewsView(ProductCacheMixin, generics.ListAPIView):
+    """
+    Cursor-paginated review feed; `?ordering=newest|oldest|highest|lowest|helpful`.
+    """
+    cache_name = 'reviews'
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ReviewFeedPagination
 
     def get_queryset(self):
         product_id = self.kwargs['id']
-        return Review.objects.filter(product_id=product_id)
+        return Review.objects.filter(product_id=product_id).select_related('user')
+
+class VoteReviewView(APIView):
+    """
+    Record the user's vote on a review; each user may vote once per review.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    value = ReviewVote.UP
+
+    def post(self, request, *args, **kwargs):
+        review = get_object_or_404(Review.objects.only('id', 'product'), id=kwargs['id'])
+        try:
+            with transaction.atomic():
+                ReviewVote.objects.create(review=review, user=request.user, value=self.value)
+                apply_review_vote(review.id, self.value)
+        except IntegrityError:
+            return Response({'error': 'You have already voted on this review'}, status=status.HTTP_409_CONFLICT)
+        invalidate_product(review.product_id)
+        review.refresh_from_db(fields=['upvotes', 'downvotes', 'helpfulness'])
+        return Response(
+            {
+                'id': review.id,
+                'upvotes': review.upvotes,
+                'downvotes': review.downvotes,
+                'helpfulness': review.helpfulness,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
 class CreateProductView(generics.CreateAPIView):
     queryset = Product.objects.all()
@@ -51,15 +184,80 @@ class DeleteProductView(generics.DestroyAPIView):
     
     
     
+class ExportProductsView(APIView):
+    """
+    Stream the catalog as NDJSON (default) or CSV for feeds and warehouse syncs.
+
+    `?output=ndjson|csv`, `?include=category,nutrition` adds columns and
+    `?since=<ISO timestamp>` limits the export to rows changed since then. Rows
+    are read with a server-side iterator, so memory use does not grow with the
+    catalog. The `X-Export-Watermark` header is the `since` to use next time.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            return Response({'error': 'output must be ndjson or csv'}, status=status.HTTP_400_BAD_REQUEST)
+        include = [
+            name for name in split_param(request.query_params.get('include')) if name in export.INCLUDES
+        ]
+        since = None
+        if request.query_params.get('since'):
+            since = parse_datetime(request.query_params['since'])
+            if since is None:
+                return Response({'error': 'since must be an ISO 8601 timestamp'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, dt_timezone.utc)
+
+        watermark = timezone.now()
+        rows = export.iter_rows(include, since)
+        if output == 'csv':
+            content = export.stream_csv(rows, export.export_columns(include))
+            response = StreamingHttpResponse(content, content_type='text/csv')
+        else:
+            content = export.stream_ndjson(rows)
+            response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="products.{output}"'
+        response['X-Export-Watermark'] = watermark.isoformat()
+        return response
+
+
+class ProductSuggestView(APIView):
+    """
+    Type-ahead suggestions for product and category names, served from memory.
+    """
+    permission_classes = [permissions.AllowAny]
+    default_limit = 8
+    max_limit = MAX_SUGGESTIONS
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+        return Response(get_suggest_index().suggest(request.query_params.get('q', ''), limit))
+
+
 class ProductSearchView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, *args, **kwargs):
         query = request.query_params.get("q", "").strip()
-        if not query:
-            return Response([])
-
-        
-        products = Product.objects.filter(name__icontains=query)[:10]  
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        fields = ProductSerializer.select_fields(
+            fields=split_param(request.query_params.get('fields')),
+            expand=split_param(request.query_params.get('expand')),
+            default=ProductSerializer.list_fields,
+        )
+        # an empty query still answers with an (empty) page
+        ranked_ids = get_search_backend().search(query) if query else []
+        paginator = ProductSearchPagination()
+        page_ids = paginator.paginate_queryset(ranked_ids, request, view=self)
+        products = ProductSerializer.setup_queryset(Product.active.all(), fields).in_bulk(page_ids)
+        serializer = ProductSerializer(
+            [products[product_id] for product_id in page_ids if product_id in products],
+            many=True,
+            fields=fields,
+        )
+        return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import Promotion, PromotionUsage
+
+
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ("name", "code", "kind", "value", "used_count", "usage_limit", "is_active", "ends_at")
+    list_filter = ("kind", "is_active")
+    search_fields = ("name", "code")
+    filter_horizontal = ("products", "categories")
+    readonly_fields = ("used_count",)
+
+
+admin.site.register(Promotion, PromotionAdmin)
+admin.site.register(PromotionUsage)
@@ -0,0 +1,177 @@
+import threading
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.cache import get_markers, touch_markers
+
+from .models import Promotion, PromotionUsage
+
+PROMOTIONS_MARKER = "promotions"
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+PricedLine = namedtuple("PricedLine", ["product_id", "category_id", "quantity", "price"])
+Quote = namedtuple("Quote", ["subtotal", "discount", "total", "promotion", "message"])
+
+
+class Rule:
+    """
+    A promotion compiled into plain values, evaluated without touching the database.
+    """
+    __slots__ = (
+        "id", "code", "name", "kind", "value", "product_ids", "category_ids",
+        "min_spend", "starts_at", "ends_at", "usage_limit", "per_user_limit",
+    )
+
+    def __init__(self, promotion, product_ids, category_ids):
+        for field in self.__slots__:
+            if field not in ("product_ids", "category_ids"):
+                setattr(self, field, getattr(promotion, field))
+        self.product_ids = frozenset(product_ids)
+        self.category_ids = frozenset(category_ids)
+
+    def is_live(self, now):
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or now < self.ends_at)
+
+    def in_scope(self, line):
+        if not self.product_ids and not self.category_ids:
+            return True
+        return line.product_id in self.product_ids or line.category_id in self.category_ids
+
+    def discount(self, lines, subtotal):
+        if subtotal < self.min_spend:
+            return ZERO
+        eligible = sum((line.price * line.quantity for line in lines if self.in_scope(line)), ZERO)
+        if self.kind == Promotion.PERCENTAGE:
+            amount = (eligible * self.value / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        else:
+            amount = self.value
+        return min(amount, eligible)
+
+
+class RuleSet:
+    """
+    Every active promotion, compiled once per change of the promotions marker.
+    """
+
+    def __init__(self, rules):
+        self.automatic = [rule for rule in rules if not rule.code]
+        self.by_code = {rule.code: rule for rule in rules if rule.code}
+
+    @classmethod
+    def build(cls):
+        now = timezone.now()
+        promotions = list(
+            Promotion.objects.filter(is_active=True)
+            .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+            .filter(Q(usage_limit__isnull=True) | Q(used_count__lt=F("usage_limit")))
+        )
+        ids = [promotion.id for promotion in promotions]
+        products, categories = {}, {}
+        for promotion_id, product_id in Promotion.products.through.objects.filter(
+            promotion_id__in=ids
+        ).values_list("promotion_id", "product_id"):
+            products.setdefault(promotion_id, []).append(product_id)
+        for promotion_id, category_id in Promotion.categories.through.objects.filter(
+            promotion_id__in=ids
+        ).values_list("promotion_id", "category_id"):
+            categories.setdefault(promotion_id, []).append(category_id)
+        return cls([
+            Rule(promotion, products.get(promotion.id, ()), categories.get(promotion.id, ()))
+            for promotion in promotions
+        ])
+
+    def evaluate(self, lines, code=None, now=None, exclude=()):
+        """
+        Price `PricedLine`s and return a `Quote` carrying the best applicable promotion.
+
+        Automatic promotions and the entered code compete; the largest discount wins
+        and discounts never stack.
+        """
+        now = now or timezone.now()
+        subtotal = sum((line.price * line.quantity for line in lines), ZERO)
+        candidates = [rule for rule in self.automatic if rule.id not in exclude]
+        message = None
+        code = (code or "").strip().upper()
+        if code:
+            rule = self.by_code.get(code)
+            if rule is None or rule.id in exclude or not rule.is_live(now):
+                message = "Promo code is invalid or expired"
+            elif subtotal < rule.min_spend:
+                message = f"Promo code requires a minimum spend of {rule.min_spend}"
+            else:
+                candidates.insert(0, rule)
+
+        best, discount = None, ZERO
+        for rule in candidates:
+            if not rule.is_live(now):
+                continue
+            amount = rule.discount(lines, subtotal)
+            if amount > discount:
+                best, discount = rule, amount
+        if code and message is None and (best is None or best.code != code):
+            message = "Promo code does not apply to this cart"
+        return Quote(subtotal, discount, subtotal - discount, best, message)
+
+
+_lock = threading.Lock()
+_rule_set = None
+_marker = None
+
+
+def get_rule_set():
+    """
+    Return this worker's compiled rule set, recompiled when a promotion changed.
+    """
+    global _rule_set, _marker
+    marker = get_markers(PROMOTIONS_MARKER)[PROMOTIONS_MARKER]
+    if _rule_set is not None and marker == _marker:
+        return _rule_set
+    with _lock:
+        if _rule_set is None or marker != _marker:
+            _rule_set = RuleSet.build()
+            _marker = marker
+    return _rule_set
+
+
+class _Exhausted(Exception):
+    pass
+
+
+def redeem(rule, user):
+    """
+    Count one use of `rule` by `user`; False if a usage limit is already reached.
+
+    Both counters are guarded single-statement increments, so concurrent checkouts
+    can never push a promotion past its limits.
+    """
+    try:
+        with transaction.atomic():
+            promotions = Promotion.objects.filter(pk=rule.id)
+            if rule.usage_limit is not None:
+                promotions = promotions.filter(used_count__lt=F("usage_limit"))
+            if not promotions.update(used_count=F("used_count") + 1):
+                raise _Exhausted
+            PromotionUsage.objects.bulk_create(
+                [PromotionUsage(promotion_id=rule.id, user=user)], ignore_conflicts=True
+            )
+            usages = PromotionUsage.objects.filter(promotion_id=rule.id, user=user)
+            if rule.per_user_limit is not None:
+                usages = usages.filter(count__lt=rule.per_user_limit)
+            if not usages.update(count=F("count") + 1):
+                raise _Exhausted
+    except _Exhausted:
+        return False
+    if rule.usage_limit is not None:
+        transaction.on_commit(lambda: _retire_if_used_up(rule.id))
+    return True
+
+
+def _retire_if_used_up(promotion_id):
+    # drop the rule from every worker's rule set once it is used up
+    if Promotion.objects.filter(pk=promotion_id, used_count__gte=F("usage_limit")).exists():
+        touch_markers(PROMOTIONS_MARKER)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:41
+
+from django.db import migrations
+
+
+def create_discount20(apps, schema_editor):
+    """
+    The 20% code checkout used to hard-code.
+    """
+    Promotion = apps.get_model('promotions', 'Promotion')
+    Promotion.objects.get_or_create(
+        code='DISCOUNT20',
+        defaults={'name': '20% off your order', 'kind': 'percentage', 'value': 20},
+    )
+
+
+def delete_discount20(apps, schema_editor):
+    apps.get_model('promotions', 'Promotion').objects.filter(code='DISCOUNT20').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_discount20, delete_discount20),
+    ]
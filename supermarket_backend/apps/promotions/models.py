@@ -0,0 +1,72 @@
+from apps.categories.models import Category
+from apps.products.models import Product
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+
+class Promotion(models.Model):
+    """
+    A discount rule.
+
+    Promotions with a code apply when the customer enters it; promotions without
+    one apply automatically. Products and categories narrow the lines the discount
+    is computed on; with neither, the whole cart is eligible.
+    """
+    PERCENTAGE = "percentage"
+    FIXED = "fixed"
+    KIND_CHOICES = [
+        (PERCENTAGE, "Percentage"),
+        (FIXED, "Fixed amount"),
+    ]
+
+    name = models.CharField(max_length=100)
+    code = models.CharField(max_length=32, blank=True, default="")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=PERCENTAGE)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    products = models.ManyToManyField(Product, related_name="promotions", blank=True)
+    categories = models.ManyToManyField(Category, related_name="promotions", blank=True)
+    min_spend = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    usage_limit = models.PositiveIntegerField(null=True, blank=True)
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True)
+    used_count = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["code"], condition=~Q(code=""), name="unique_promotion_code"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.code or self.name
+
+
+class PromotionUsage(models.Model):
+    """
+    How many times a user has redeemed a promotion, for per-user limits.
+    """
+    promotion = models.ForeignKey(Promotion, related_name="usages", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="promotion_usages", on_delete=models.CASCADE
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["promotion", "user"], name="unique_promotion_usage"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} used {self.promotion_id} {self.count}x"
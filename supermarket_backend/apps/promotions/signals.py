@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import touch_markers
+
+from .engine import PROMOTIONS_MARKER
+from .models import Promotion
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(m2m_changed, sender=Promotion.products.through)
+@receiver(m2m_changed, sender=Promotion.categories.through)
+def recompile_promotions(sender, **kwargs):
+    transaction.on_commit(lambda: touch_markers(PROMOTIONS_MARKER))
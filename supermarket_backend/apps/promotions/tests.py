@@ -0,0 +1,81 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.categories.models import Category
+from apps.products.models import Product
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .engine import PricedLine, RuleSet, get_rule_set, redeem
+from .models import Promotion, PromotionUsage
+
+
+class RuleSetTests(TestCase):
+    def setUp(self):
+        Promotion.objects.all().delete()
+        self.fruit = Category.objects.create(name="Fruit", slug="fruit")
+        self.lines = [
+            PricedLine(0, self.fruit.id, 2, Decimal("3.00")),
+            PricedLine(0, None, 1, Decimal("4.00")),
+        ]
+
+    def evaluate(self, code=None):
+        return RuleSet.build().evaluate(self.lines, code=code)
+
+    def test_percentage_on_category(self):
+        promotion = Promotion.objects.create(name="Fruit", code="fruit10", value=10)
+        promotion.categories.add(self.fruit)
+
+        quote = self.evaluate("FRUIT10")
+
+        self.assertEqual((quote.subtotal, quote.discount, quote.total), (Decimal("10.00"), Decimal("0.60"), Decimal("9.40")))
+        self.assertIsNone(quote.message)
+
+    def test_fixed_discount_is_capped_by_eligible_lines(self):
+        promotion = Promotion.objects.create(name="Five off", kind=Promotion.FIXED, value=5)
+        promotion.products.add(Product.objects.create(name="Pear", price="4.00", description="", image="http://e.com/p.png"))
+        self.lines[1] = self.lines[1]._replace(product_id=promotion.products.get().id)
+
+        self.assertEqual(self.evaluate().discount, Decimal("4.00"))
+
+    def test_best_discount_wins_and_codes_are_checked(self):
+        Promotion.objects.create(name="Everything", value=5)
+        Promotion.objects.create(name="Big spenders", code="BIG", value=50, min_spend=100)
+        Promotion.objects.create(
+            name="Expired", code="OLD", value=50, ends_at=timezone.now() - timedelta(days=1)
+        )
+
+        self.assertEqual(self.evaluate().discount, Decimal("0.50"))
+        self.assertIn("minimum spend", self.evaluate("big").message)
+        self.assertEqual(self.evaluate("OLD").message, "Promo code is invalid or expired")
+
+    def test_usage_limits(self):
+        user = get_user_model().objects.create_user(email="a@example.com", name="A", password="secret")
+        other = get_user_model().objects.create_user(email="b@example.com", name="B", password="secret")
+        Promotion.objects.create(name="Once", code="ONCE", value=10, usage_limit=2, per_user_limit=1)
+        rule = RuleSet.build().by_code["ONCE"]
+
+        self.assertTrue(redeem(rule, user))
+        self.assertFalse(redeem(rule, user))
+        self.assertTrue(redeem(rule, other))
+        self.assertFalse(redeem(rule, other))
+        self.assertEqual(Promotion.objects.get(code="ONCE").used_count, 2)
+        self.assertEqual(sorted(PromotionUsage.objects.values_list("count", flat=True)), [1, 1])
+
+
+class CartPreviewTests(TestCase):
+    def test_guest_preview_uses_seeded_code(self):
+        client = APIClient()
+        product = Product.objects.create(name="Apple", price="2.50", description="", image="http://e.com/a.png")
+        client.post("/api/cart/add/", {"product_id": product.id, "quantity": 4}, format="json")
+        get_rule_set()
+
+        with self.assertNumQueries(1):
+            response = client.get("/api/cart/preview/", {"promo_code": "discount20"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["discount"], Decimal("2.00"))
+        self.assertEqual(response.data["total"], Decimal("8.00"))
+        self.assertEqual(response.data["promotion"]["code"], "DISCOUNT20")
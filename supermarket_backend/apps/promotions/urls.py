@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import CartPreviewView
+
+urlpatterns = [
+    path("cart/preview/", CartPreviewView.as_view(), name="cart-preview"),
+]
@@ -0,0 +1,47 @@
+from apps.cart.views import CartStoreMixin
+from apps.products.models import Product
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .engine import PricedLine, get_rule_set
+
+
+class CartPreviewView(CartStoreMixin, APIView):
+    """
+    Price the current cart with the promotion checkout would apply.
+
+    `?promo_code=` is optional; automatic promotions are always considered. Prices
+    and categories come from one product query, the rules from the compiled set.
+    """
+
+    def get(self, request, *args, **kwargs):
+        lines = self.store.lines(request.user)
+        products = {
+            product_id: (category_id, price)
+            for product_id, category_id, price in Product.active.filter(
+                id__in=[line.product_id for line in lines]
+            ).values_list("id", "category_id", "price")
+        }
+        priced = [
+            PricedLine(line.product_id, products[line.product_id][0], line.quantity, products[line.product_id][1])
+            for line in lines
+            if line.product_id in products
+        ]
+        quote = get_rule_set().evaluate(priced, code=request.query_params.get("promo_code"))
+        promotion = quote.promotion
+        return Response(
+            {
+                "subtotal": quote.subtotal,
+                "discount": quote.discount,
+                "total": quote.total,
+                "promotion": promotion and {
+                    "name": promotion.name,
+                    "code": promotion.code,
+                    "kind": promotion.kind,
+                    "value": promotion.value,
+                },
+                "message": quote.message,
+            },
+            status=status.HTTP_200_OK,
+        )
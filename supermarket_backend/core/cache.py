@@ -0,0 +1,97 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """
+    Return the current version token for `name`.
+
+    Versions live in the shared cache so every worker sees the same value. If the
+    entry is missing (first use or eviction) it is seeded from the clock, which
+    keeps it ahead of any value handed out before the eviction.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*names):
+    """
+    Advance the version of every name, invalidating whatever was derived from it.
+    """
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def _marker_key(name):
+    return f'marker:{name}'
+
+
+def get_markers(*names):
+    """
+    Return `{name: timestamp_ns}` of the last write recorded for each change marker.
+
+    Missing markers are seeded with the current time, so after an eviction clients
+    simply see a newer marker and refetch once.
+    """
+    keys = {_marker_key(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: value for key, value in found.items()}
+
+
+def touch_markers(*names):
+    """
+    Record a write against each change marker.
+    """
+    now = time.time_ns()
+    cache.set_many({_marker_key(name): now for name in names}, timeout=None)
+
+
+def get_or_build(key, builder, timeout=300, lock_timeout=10, poll_interval=0.05):
+    """
+    Return `cache[key]`, building it with `builder()` on a miss.
+
+    Misses are single-flight: the first caller takes a short-lived lock and builds
+    the value while concurrent callers poll for the result instead of all hitting
+    the database at once. If the builder does not finish within `lock_timeout`
+    the waiters build it themselves.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'lock:{key}'
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            value = builder()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            break
+    return builder()
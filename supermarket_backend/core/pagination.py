@@ -0,0 +1,129 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a single sort column plus a unique tiebreak.
+
+    Each page is fetched with `WHERE (key, id) > (last_key, last_id) ORDER BY key, id
+    LIMIT n`, so the cost of a page does not grow with how deep the client has
+    scrolled. Cursors are opaque base64 tokens bound to the ordering they were
+    issued for.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+
+    # Columns clients may sort on, and the ordering used when none is given.
+    ordering_fields = ('id',)
+    default_ordering = 'id'
+    # Friendly names clients may send instead, e.g. {'newest': '-date'}.
+    ordering_aliases = {}
+    tiebreak_field = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        field, descending = self._split(self.ordering)
+        tiebreak = f'-{self.tiebreak_field}' if descending else self.tiebreak_field
+
+        queryset = queryset.order_by(self.ordering, tiebreak)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(field, descending, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        ordering = self.ordering_aliases.get(ordering, ordering)
+        if self._split(ordering)[0] not in self.ordering_fields:
+            return self.default_ordering
+        return ordering
+
+    def get_position_filter(self, field, descending, position):
+        value, last_id = position
+        op = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{field}__{op}': value})
+            | Q(**{field: value, f'{self.tiebreak_field}__{op}': last_id})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            ordering, value, last_id = json.loads(urlsafe_b64decode(padded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound('Invalid cursor')
+        if ordering != self.ordering:
+            raise NotFound('Invalid cursor')
+        return value, last_id
+
+    def encode_cursor(self, instance):
+        field, _ = self._split(self.ordering)
+        value = getattr(instance, field)
+        if value is not None and not isinstance(value, (int, float, str)):
+            value = str(value)
+        payload = json.dumps(
+            [self.ordering, value, getattr(instance, self.tiebreak_field)],
+            separators=(',', ':'),
+        )
+        return urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.ordering_query_param, self.ordering)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('first', self.get_first_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def _split(ordering):
+        return ordering.lstrip('-'), ordering.startswith('-')
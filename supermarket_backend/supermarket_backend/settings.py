@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     "apps.orders.apps.OrdersConfig",
     "apps.categories.apps.CategoriesConfig",
     "apps.cart.apps.CartConfig",
+    "apps.promotions.apps.PromotionsConfig",
 ]
 
 MIDDLEWARE = [
@@ -88,6 +89,23 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Writers wait this many seconds for SQLite's lock instead of failing at once.
+        "OPTIONS": {"timeout": 20},
+        # File-backed test database: threaded tests then wait on SQLite's lock
+        # instead of failing, as they do on the shared in-memory database.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Version counters and cached catalog data are shared through this cache, so
+# production should point it at Redis; locmem is per-process.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
@@ -147,6 +165,28 @@ REST_FRAMEWORK = {
 }
 
 
+PRODUCT_SEARCH_BACKEND = "apps.products.search.InvertedIndexBackend"
+# Search ranks and pages through at most this many hits per query.
+PRODUCT_SEARCH_MAX_RESULTS = 1000
+
+# Seconds a cached product detail/related/reviews payload may live.
+PRODUCT_CACHE_TIMEOUT = 300
+
+# Where carts live: "apps.cart.storage.DatabaseCartStore" (default) or
+# "apps.cart.storage.RedisCartStore", which keeps carts in Redis and writes them
+# behind to the database (run `manage.py flush_carts` periodically).
+CART_STORAGE = "apps.cart.storage.DatabaseCartStore"
+CART_REDIS_URL = "redis://localhost:6379/1"
+# Seconds an idle cart stays in Redis; it is reloaded from the database after.
+CART_REDIS_TTL = 60 * 60 * 24 * 7
+
+# Order ids are time-ordered Snowflake ids; every process issuing them needs a
+# distinct worker id (0-1023). When unset, each process leases one from the
+# database on its first checkout.
+ORDER_ID_GENERATOR = "apps.orders.ids.SnowflakeGenerator"
+ORDER_ID_WORKER_ID = None
+
+
 CORS_ALLOW_CREDENTIALS = True
 
 CORS_ALLOWED_ORIGINS = [  
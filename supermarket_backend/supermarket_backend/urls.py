@@ -25,4 +25,5 @@ urlpatterns = [
     path("api/", include("apps.categories.urls")),
     path("api/", include("apps.cart.urls")),
     path('api/', include('apps.orders.urls')),
+    path("api/", include("apps.promotions.urls")),
 ]